@@ -0,0 +1,129 @@
+"""
+Batch ingest throughput when some events in the batch are rejected by the database.
+
+Batches are new events of the synthetic catalogue (benchmarks.datagen), a share of
+them made bad (a title longer than the column allows, so they fail in the INSERT,
+like real constraint violations). Three ways of writing them:
+
+  plain      bulk_upsert_events in one transaction: any bad event rolls back the batch
+  per-event  one SAVEPOINT per event around bulk_upsert_events([event])
+  isolated   bulk_upsert_isolated: the batch in one SAVEPOINT, bisected on failure
+
+Reported per strategy and failure rate: events written per second, how many events were
+stored and rejected, and the savepoints used per batch.
+
+Usage (DATABASE_URL must point at a disposable database):
+    python -m benchmarks.bench_batch_failures --batch 1000 --batches 5 --rates 0,0.001,0.01,0.05
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+from typing import List
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+import schemas
+from benchmarks.datagen import Catalogue
+from database import async_session_factory, init_async_db
+from services import bulk as bulk_service
+
+savepoints = 0
+
+
+def _count_savepoint(session, transaction):
+    global savepoints
+    if transaction.nested:
+        savepoints += 1
+
+
+def batch_events(catalogue: Catalogue, first: int, size: int, rate: float, rng: random.Random) -> List[schemas.EventCreate]:
+    """Catalogue events first..first+size, each made bad with probability `rate`."""
+    events = []
+    for i in range(first, first + size):
+        payload = catalogue.event(i)
+        if rng.random() < rate:
+            payload["title"] = "x" * 300
+        events.append(schemas.EventCreate.model_validate(payload))
+    return events
+
+
+async def plain(session, events):
+    try:
+        result = await bulk_service.bulk_upsert_events(session, events)
+    except Exception:
+        await session.rollback()
+        return 0, len(events)
+    return len(result.created) + len(result.updated), 0
+
+
+async def per_event(session, events):
+    written = failed = 0
+    for event_data in events:
+        try:
+            async with session.begin_nested():
+                await bulk_service.bulk_upsert_events(session, [event_data])
+            written += 1
+        except Exception:
+            failed += 1
+    return written, failed
+
+
+async def isolated(session, events):
+    result = await bulk_service.bulk_upsert_isolated(session, events)
+    return len(result.created) + len(result.updated), len(result.failed)
+
+
+async def run(write, rate, args, catalogue, batch_numbers, rng):
+    global savepoints
+    elapsed, written, failed, used = [], 0, 0, []
+    for _ in range(args.batches):
+        events = batch_events(catalogue, next(batch_numbers) * args.batch, args.batch, rate, rng)
+        async with async_session_factory() as session:
+            savepoints = 0
+            started = time.perf_counter()
+            ok, bad = await write(session, events)
+            await session.commit()
+            elapsed.append(time.perf_counter() - started)
+            used.append(savepoints)
+        written += ok
+        failed += bad
+    return {
+        "events_per_s": written / sum(elapsed),
+        "batch_ms": statistics.median(elapsed) * 1000,
+        "written": written,
+        "failed": failed,
+        "savepoints": statistics.fmean(used),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=1000, help="events per batch")
+    parser.add_argument("--batches", type=int, default=5, help="batches per strategy and rate")
+    parser.add_argument("--rates", default="0,0.001,0.01,0.05", help="shares of bad events to try")
+    parser.add_argument("--random-seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    # Every batch takes the next unused events of the catalogue, so it only creates
+    catalogue = Catalogue(args.batch, seed=args.random_seed, prefix=f"bench-batch-{rng.randrange(1 << 30)}")
+    batch_numbers = itertools.count()
+    await init_async_db()
+    sa_event.listen(Session, "after_transaction_create", _count_savepoint)
+    # Warm up dimension caches and connections
+    await run(isolated, 0.0, argparse.Namespace(batch=args.batch, batches=1), catalogue, batch_numbers, rng)
+
+    print(f"{'strategy':<11}{'rate':>7}{'events/s':>10}{'batch ms':>10}{'written':>9}{'failed':>8}{'savepoints':>12}")
+    for rate in (float(r) for r in args.rates.split(",")):
+        for name, write in (("plain", plain), ("per-event", per_event), ("isolated", isolated)):
+            r = await run(write, rate, args, catalogue, batch_numbers, rng)
+            print(f"{name:<11}{rate:>7.2%}{r['events_per_s']:>10.0f}{r['batch_ms']:>10.1f}"
+                  f"{r['written']:>9}{r['failed']:>8}{r['savepoints']:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
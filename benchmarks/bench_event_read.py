@@ -0,0 +1,94 @@
+"""
+Compare the two single-event read paths against a real database, on events of the
+synthetic catalogue (benchmarks.datagen):
+
+  orm   services.events.get_event_by_slug + EventResponse serialization
+  json  services.materialize.get_event_json (one statement, pre-serialized)
+
+Usage (DATABASE_URL must point at a disposable database when seeding):
+    python -m benchmarks.bench_event_read --seed 500 --iterations 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+import schemas
+from benchmarks.datagen import Catalogue
+from database import async_session_factory, init_async_db
+from services import bulk as bulk_service
+from services import events as event_service
+from services import materialize
+
+
+async def seed(catalogue: Catalogue) -> None:
+    async with async_session_factory() as session:
+        await bulk_service.bulk_upsert_events(session, catalogue.event_models())
+        await session.commit()
+
+
+async def read_orm(session, slug: str) -> bytes:
+    event = await event_service.get_event_by_slug(session, slug)
+    return schemas.EventResponse.model_validate(event).model_dump_json().encode()
+
+
+async def read_json(session, slug: str) -> bytes:
+    return await materialize.get_event_json(session, slug)
+
+
+async def measure(name, reader, slugs, iterations):
+    latencies = []
+    async with async_session_factory() as session:
+        # Warm up connection and statement caches
+        for slug in slugs[:20]:
+            await reader(session, slug)
+
+        tracemalloc.start()
+        for n in range(iterations):
+            slug = slugs[n % len(slugs)]
+            started = time.perf_counter()
+            await reader(session, slug)
+            latencies.append((time.perf_counter() - started) * 1000)
+            session.expunge_all()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    latencies.sort()
+    allocated = sum(stat.size for stat in snapshot.statistics("filename"))
+    return {
+        "path": name,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "mean_ms": statistics.fmean(latencies),
+        "peak_kib": peak / 1024,
+        "retained_kib": allocated / 1024,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="upsert N synthetic events first")
+    parser.add_argument("--events", type=int, default=200, help="number of distinct slugs to read")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    await init_async_db()
+    catalogue = Catalogue(args.seed or args.events, prefix="bench-read")
+    if args.seed:
+        await seed(catalogue)
+    slugs = [catalogue.slug(i) for i in range(min(args.events, catalogue.size))]
+
+    results = [
+        await measure("orm", read_orm, slugs, args.iterations),
+        await measure("json", read_json, slugs, args.iterations),
+    ]
+    print(f"{'path':<6}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'peak KiB':>12}{'retained KiB':>14}")
+    for r in results:
+        print(f"{r['path']:<6}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['mean_ms']:>10.3f}"
+              f"{r['peak_kib']:>12.1f}{r['retained_kib']:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Cost of the /metrics instrumentation (services.metrics), without a database:
+
+  request    a trivial FastAPI route called through ASGI directly, with and without
+             MetricsMiddleware; the difference is the per-request overhead
+  statement  `SELECT 1` on in-memory SQLite, with and without the cursor event hooks
+             of instrument_engine; the difference is the per-statement overhead
+  dispatch   the same with no-op cursor listeners: the share of that overhead that
+             is SQLAlchemy's event dispatch, paid by any engine event listener
+  render     producing the /metrics text with every route of the app recorded
+
+Each variant is run --repeat times and the fastest run is kept, which filters out
+scheduler noise on short loops.
+
+Usage:
+    python -m benchmarks.bench_metrics --iterations 20000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, text
+
+from services import metrics
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+async def call(app, path: str) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def time_requests(app, iterations: int) -> float:
+    for n in range(200):  # warm-up (route compilation, middleware stack build)
+        await call(app, f"/items/{n}")
+    started = time.perf_counter()
+    for n in range(iterations):
+        await call(app, f"/items/{n}")
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def time_statements(engine, iterations: int) -> float:
+    with engine.connect() as conn:
+        statement = text("SELECT 1")
+        for _ in range(200):
+            conn.execute(statement)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            conn.execute(statement)
+        return (time.perf_counter() - started) / iterations * 1e6
+
+
+def time_render(iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        metrics.render()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    plain_app, instrumented_app = make_app(False), make_app(True)
+    plain = min([await time_requests(plain_app, args.iterations) for _ in range(args.repeat)])
+    instrumented = min([await time_requests(instrumented_app, args.iterations) for _ in range(args.repeat)])
+
+    plain_engine, noop_engine, instrumented_engine = (create_engine("sqlite://") for _ in range(3))
+    for name in ("before_cursor_execute", "after_cursor_execute"):
+        event.listen(noop_engine, name, lambda *args: None)
+    metrics.instrument_engine(instrumented_engine, "bench")
+    bare = min(time_statements(plain_engine, args.iterations) for _ in range(args.repeat))
+    noop = min(time_statements(noop_engine, args.iterations) for _ in range(args.repeat))
+    hooked = min(time_statements(instrumented_engine, args.iterations) for _ in range(args.repeat))
+
+    render = min(time_render(200) for _ in range(args.repeat))
+
+    print(f"{'measure':<12}{'plain µs':>10}{'metrics µs':>12}{'overhead µs':>13}")
+    print(f"{'request':<12}{plain:>10.2f}{instrumented:>12.2f}{instrumented - plain:>13.2f}")
+    print(f"{'statement':<12}{bare:>10.2f}{hooked:>12.2f}{hooked - bare:>13.2f}")
+    print(f"{'dispatch':<12}{bare:>10.2f}{noop:>12.2f}{noop - bare:>13.2f}")
+    print(f"{'render':<12}{'':>10}{render:>12.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
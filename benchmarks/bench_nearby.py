@@ -0,0 +1,153 @@
+"""
+Latency of "events near me" (services.geo.list_nearby) on the synthetic catalogue
+(benchmarks.datagen).
+
+Its venues are scattered around each city centre (denser towards the middle), every
+event has a default venue and upcoming occurrences, some of which are at another
+venue. Query points are drawn around Moscow, the biggest city, from the same
+distribution. Three ways of answering are timed:
+
+  python   load every venue, filter by haversine distance in Python, then fetch
+           occurrences of the matching venues (what the app did before)
+  seqscan  list_nearby with index and bitmap scans disabled
+  indexed  list_nearby (GiST bounding box + venue indexes)
+
+Usage (DATABASE_URL must point at a disposable database when seeding):
+    python -m benchmarks.bench_nearby --seed-venues 5000 --seed-events 20000 --queries 200 --radius 1,3,10
+"""
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+
+from benchmarks.datagen import CITIES, Catalogue
+from database import async_session_factory, init_async_db
+from db import models
+from services import bulk as bulk_service
+from services import geo
+
+CENTRE = CITIES[0][2]  # Moscow
+CITY_RADIUS_KM = 15.0  # as far as datagen places venues from a centre
+
+
+def random_point(rng: random.Random):
+    """Point within CITY_RADIUS_KM of the centre, denser towards it."""
+    distance = CITY_RADIUS_KM * rng.random() ** 1.5
+    bearing = rng.uniform(0, 2 * math.pi)
+    dlat = distance * math.cos(bearing) / geo.KM_PER_DEGREE
+    dlon = distance * math.sin(bearing) / (geo.KM_PER_DEGREE * math.cos(math.radians(CENTRE[0])))
+    return CENTRE[0] + dlat, CENTRE[1] + dlon
+
+
+async def seed(venue_count: int, event_count: int, rng: random.Random) -> None:
+    catalogue = Catalogue(event_count, venues=venue_count, seed=rng.randrange(1 << 30), prefix="bench-nearby")
+    batch = 1000
+    for start in range(0, event_count, batch):
+        async with async_session_factory() as session:
+            events = catalogue.event_models(start, min(event_count, start + batch))
+            await bulk_service.bulk_upsert_events(session, events)
+            await session.commit()
+        print(f"seeded {min(event_count, start + batch)}/{event_count}", flush=True)
+    async with async_session_factory() as session:
+        await session.execute(text("ANALYZE venues"))
+        await session.execute(text("ANALYZE events"))
+        await session.execute(text("ANALYZE event_occurrences"))
+        await session.commit()
+
+
+async def python_filter(session, lat: float, lon: float, radius_km: float, limit: int):
+    venue = models.Venue
+    occ = models.EventOccurrence
+    ev = models.Event
+    rows = (await session.execute(select(venue.id, venue.lat, venue.lon).where(venue.lat.is_not(None)))).all()
+    distances = {}
+    for venue_id, venue_lat, venue_lon in rows:
+        distance = geo.haversine_km(lat, lon, venue_lat, venue_lon)
+        if distance <= radius_km:
+            distances[venue_id] = distance
+    if not distances:
+        return []
+    located_at = func.coalesce(occ.venue_id, ev.venue_id)
+    stmt = (
+        select(occ.id, occ.start_time, located_at)
+        .join(ev, ev.id == occ.event_id)
+        .where(located_at.in_(list(distances)), occ.start_time >= func.now())
+    )
+    found = (await session.execute(stmt)).all()
+    found.sort(key=lambda row: (distances[row[2]], row[1], row[0]))
+    return found[:limit]
+
+
+async def indexed(session, lat: float, lon: float, radius_km: float, limit: int):
+    items, _ = await geo.list_nearby(session, lat, lon, radius_km, limit=limit)
+    return items
+
+
+async def seqscan(session, lat: float, lon: float, radius_km: float, limit: int):
+    await session.execute(text("SET LOCAL enable_indexscan = off"))
+    await session.execute(text("SET LOCAL enable_bitmapscan = off"))
+    items, _ = await geo.list_nearby(session, lat, lon, radius_km, limit=limit)
+    return items
+
+
+async def run(search, points, radius_km: float, limit: int):
+    latencies, hits = [], []
+    async with async_session_factory() as session:
+        for lat, lon in points[:5]:  # warm-up
+            await search(session, lat, lon, radius_km, limit)
+            await session.rollback()
+        for lat, lon in points:
+            started = time.perf_counter()
+            found = await search(session, lat, lon, radius_km, limit)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits.append(len(found))
+            await session.rollback()  # SET LOCAL settings end with the transaction
+    latencies.sort()
+    return latencies, hits
+
+
+async def uses_index(lat: float, lon: float) -> bool:
+    async with async_session_factory() as session:
+        stmt = geo.nearby_venues(lat, lon, 1.0)
+        compiled = stmt.compile(session.bind, compile_kwargs={"literal_binds": True})
+        plan = (await session.execute(text("EXPLAIN " + str(compiled)))).scalars().all()
+    return any("idx_venue_location" in line for line in plan)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed-venues", type=int, default=5000)
+    parser.add_argument("--seed-events", type=int, default=0, help="store N synthetic events first")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", default="1,3,10", help="radii in km to try")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--random-seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    await init_async_db()
+    if args.seed_events:
+        await seed(args.seed_venues, args.seed_events, rng)
+
+    async with async_session_factory() as session:
+        venues = (await session.execute(select(func.count()).select_from(models.Venue))).scalar()
+        occurrences = (await session.execute(select(func.count()).select_from(models.EventOccurrence))).scalar()
+    if not occurrences:
+        raise SystemExit("no data, run with --seed-events N first")
+    points = [random_point(rng) for _ in range(args.queries)]
+    print(f"{venues} venues, {occurrences} occurrences; index used: {await uses_index(*CENTRE)}")
+
+    print(f"{'search':<10}{'radius':>8}{'hits':>8}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for radius_km in (float(r) for r in args.radius.split(",")):
+        for name, search in (("python", python_filter), ("seqscan", seqscan), ("indexed", indexed)):
+            latencies, hits = await run(search, points, radius_km, args.limit)
+            print(f"{name:<10}{radius_km:>8g}{statistics.fmean(hits):>8.1f}{statistics.median(latencies):>10.3f}"
+                  f"{latencies[int(len(latencies) * 0.95) - 1]:>10.3f}{statistics.fmean(latencies):>10.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Read latency while batch writers run, with one shared connection pool and with the
+separate ingest pool (database.INGEST_POOL_SIZE).
+
+Each mode runs in its own process, since the pools are configured from the environment
+at import: `shared` sets DB_INGEST_POOL_SIZE=0, `lanes` keeps the ingest pool. In both,
+--writers concurrent clients re-post batches of a synthetic catalogue through
+POST /events/batch while --readers clients call GET /events/{slug} (response cache
+off) until the writers are done. The main pool has --pool-size connections and no
+overflow, so writers holding them shows up as reader wait.
+
+Usage (DATABASE_URL must point at a disposable database; needs requirements-dev.txt):
+    python -m benchmarks.bench_pool_lanes --writers 6 --readers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+async def child(args) -> dict:
+    from benchmarks.datagen import Catalogue
+    from benchmarks.suite import latency_summary, set_response_cache
+    from database import init_async_db
+    from main import app
+    from services import metrics
+
+    await init_async_db()
+    set_response_cache(False)
+    catalogue = Catalogue(args.events, prefix="lanes")
+    batches = [catalogue.events(start, min(catalogue.size, start + args.batch)) for start in range(0, catalogue.size, args.batch)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for payloads in batches:  # make sure every slug exists
+            (await client.post("/events/batch", json=payloads)).raise_for_status()
+
+        done = asyncio.Event()
+        latencies = []
+        written = 0
+        peak_waiting = {}
+
+        async def writer(n: int):
+            nonlocal written
+            for round in range(args.rounds):
+                payloads = batches[(n + round) % len(batches)]
+                (await client.post("/events/batch", json=payloads)).raise_for_status()
+                written += len(payloads)
+
+        async def reader(n: int):
+            rng = random.Random(n)
+            while not done.is_set():
+                slug = catalogue.slug(rng.randrange(catalogue.size))
+                started = time.perf_counter()
+                (await client.get(f"/events/{slug}")).raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        async def watch():
+            while not done.is_set():
+                for name, pool in metrics.pool_stats().items():
+                    peak_waiting[name] = max(peak_waiting.get(name, 0), pool["waiting"])
+                await asyncio.sleep(0.01)
+
+        readers = [asyncio.create_task(reader(n)) for n in range(args.readers)]
+        watcher = asyncio.create_task(watch())
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(n) for n in range(args.writers)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*readers, watcher)
+
+    return {
+        "events_per_s": written / elapsed,
+        "peak_waiting": peak_waiting,
+        **latency_summary(latencies),
+        "max_ms": max(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--writers", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=3, help="batches per writer")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4, help="main pool connections")
+    parser.add_argument("--ingest-pool-size", type=int, default=2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args))))
+        return
+
+    print(f"{'mode':<8}{'write ev/s':>12}{'reads':>8}{'read p50':>10}{'p99 ms':>9}{'max ms':>9}  peak waiting")
+    for mode, ingest_size in (("shared", 0), ("lanes", args.ingest_pool_size)):
+        env = dict(
+            os.environ,
+            DB_POOL_SIZE=str(args.pool_size),
+            DB_MAX_OVERFLOW="0",
+            DB_INGEST_POOL_SIZE=str(ingest_size),
+            DB_INGEST_MAX_OVERFLOW="0",
+            DB_POOL_TIMEOUT="120",
+        )
+        command = [sys.executable, "-m", "benchmarks.bench_pool_lanes", "--child"] + [
+            f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items() if name != "child"
+        ]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{mode:<8}{r['events_per_s']:>12.0f}{r['requests']:>8}{r['p50_ms']:>10.1f}{r['p99_ms']:>9.1f}"
+            f"{r['max_ms']:>9.1f}  {r['peak_waiting']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Recall and latency of ANN vector search against exact search on a synthetic corpus.
+
+Events of the synthetic catalogue (benchmarks.datagen) get random unit vectors drawn
+around a number of cluster centres (so neighbourhoods are meaningful), stored under
+their own model_name, and indexed with that model's
+partial HNSW or IVFFlat index. Queries are perturbed copies of corpus vectors; the
+exact top-k (index disabled) is the ground truth for recall@k.
+
+Usage (DATABASE_URL must point at a disposable database when seeding):
+    python -m benchmarks.bench_vector_search --seed 20000 --queries 200 --index hnsw --ef 10,40,100
+    python -m benchmarks.bench_vector_search --index ivfflat --probes 1,5,10,20
+"""
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import time
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+import schemas
+from benchmarks.datagen import Catalogue
+from database import async_session_factory, init_async_db, vector_index_name, vector_index_statement
+from db import models
+from services import bulk as bulk_service
+from services import vector as vector_service
+
+MODEL_NAME = "bench-vector"
+
+
+def unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def perturb(rng: random.Random, vector, noise: float):
+    return unit([x + rng.gauss(0, noise) for x in vector])
+
+
+async def seed(count: int, clusters: int, rng: random.Random) -> None:
+    dim = vector_service.DIMENSIONS
+    centres = [unit([rng.gauss(0, 1) for _ in range(dim)]) for _ in range(clusters)]
+    catalogue = Catalogue(count, seed=rng.randrange(1 << 30), prefix="bench-vector")
+    batch = 1000
+    for start in range(0, count, batch):
+        async with async_session_factory() as session:
+            events = catalogue.event_models(start, min(count, start + batch))
+            result = await bulk_service.bulk_upsert_events(session, events)
+            rows = [
+                {
+                    "event_id": result.event_ids[e.slug],
+                    "model_name": MODEL_NAME,
+                    "dim": dim,
+                    "embedding": perturb(rng, centres[rng.randrange(clusters)], 0.08),
+                }
+                for e in events
+            ]
+            await session.execute(
+                delete(models.EventEmbedding).where(
+                    models.EventEmbedding.model_name == MODEL_NAME,
+                    models.EventEmbedding.event_id.in_([row["event_id"] for row in rows]),
+                )
+            )
+            for i in range(0, len(rows), 500):
+                await session.execute(insert(models.EventEmbedding).values(rows[i:i + 500]))
+            await session.commit()
+        print(f"seeded {min(count, start + batch)}/{count}", flush=True)
+
+
+async def build_index(index_type: str) -> None:
+    async with async_session_factory() as session:
+        # Only the index under test may exist, or the planner picks between both
+        other = "ivfflat" if index_type == "hnsw" else "hnsw"
+        await session.execute(text(f"DROP INDEX IF EXISTS {vector_index_name(MODEL_NAME, other)}"))
+        started = time.perf_counter()
+        await session.execute(text(vector_index_statement(MODEL_NAME, index_type)))
+        await session.execute(text("ANALYZE event_embeddings"))
+        await session.commit()
+        print(f"{index_type} index ready in {time.perf_counter() - started:.1f}s")
+
+
+async def sample_queries(count: int, rng: random.Random):
+    async with async_session_factory() as session:
+        stmt = (
+            select(models.EventEmbedding.embedding)
+            .where(models.EventEmbedding.model_name == MODEL_NAME)
+            .order_by(func.random())
+            .limit(count)
+        )
+        stored = (await session.execute(stmt)).scalars().all()
+    return [perturb(rng, list(vector), 0.05) for vector in stored]
+
+
+async def run(queries, k, filters, **params):
+    latencies, results = [], []
+    async with async_session_factory() as session:
+        for vector in queries:
+            started = time.perf_counter()
+            hits = await vector_service.search_event_ids(session, vector, MODEL_NAME, k=k, **params, **filters)
+            latencies.append((time.perf_counter() - started) * 1000)
+            results.append([event_id for event_id, _ in hits])
+            await session.rollback()  # SET LOCAL settings end with the transaction
+    latencies.sort()
+    return results, latencies
+
+
+async def uses_index(vector, k, filters) -> bool:
+    async with async_session_factory() as session:
+        stmt = vector_service._nearest(vector, MODEL_NAME, k, **filters)
+        compiled = stmt.compile(session.bind, compile_kwargs={"literal_binds": True})
+        plan = (await session.execute(text("EXPLAIN " + str(compiled)))).scalars().all()
+    return any("idx_embedding_" in line for line in plan)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="store N synthetic events with embeddings first")
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--ef", default="10,20,40,80,160", help="hnsw.ef_search values to try")
+    parser.add_argument("--probes", default="1,5,10,20", help="ivfflat.probes values to try")
+    parser.add_argument("--status", choices=[s.value for s in schemas.EventStatus], help="filter hits by status")
+    parser.add_argument("--random-seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    await init_async_db()
+    if args.seed:
+        await seed(args.seed, args.clusters, rng)
+    await build_index(args.index)
+
+    filters = {"status": schemas.EventStatus(args.status)} if args.status else {}
+    queries = await sample_queries(args.queries, rng)
+    if not queries:
+        raise SystemExit(f"no embeddings for {MODEL_NAME}, run with --seed N first")
+    print(f"index used: {await uses_index(queries[0], args.k, filters)}")
+
+    exact, exact_latencies = await run(queries, args.k, filters, exact=True)
+
+    if args.index == "hnsw":
+        settings = [("ef_search", int(v)) for v in args.ef.split(",")]
+    else:
+        settings = [("probes", int(v)) for v in args.probes.split(",")]
+
+    print(f"{'search':<16}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+
+    def report(name, results, latencies):
+        recall = statistics.fmean(
+            len(set(found) & set(truth)) / max(1, len(truth)) for found, truth in zip(results, exact)
+        )
+        print(f"{name:<16}{recall:>10.3f}{statistics.median(latencies):>10.3f}"
+              f"{latencies[int(len(latencies) * 0.95) - 1]:>10.3f}{statistics.fmean(latencies):>10.3f}")
+
+    report("exact", exact, exact_latencies)
+    for param, value in settings:
+        results, latencies = await run(queries, args.k, filters, **{param: value})
+        report(f"{param}={value}", results, latencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
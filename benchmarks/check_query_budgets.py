@@ -0,0 +1,90 @@
+"""
+Pin the number of SQL statements of the hot service paths (services.profiling).
+
+Each case runs once under assert_max_queries, commit included. Going over a budget
+prints every statement with its call site and exits non-zero, so an extra per-row
+SELECT or another relationship in a loader chain fails here instead of multiplying
+DB load.
+Budgets are exact today: lower them when a path gets cheaper.
+
+Usage (DATABASE_URL must point at a disposable database):
+    python -m benchmarks.check_query_budgets
+"""
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import schemas
+from database import async_session_factory, init_async_db
+from services import events as event_service
+from services import materialize
+from services.profiling import QueryBudgetExceeded, assert_max_queries
+
+# Write budgets include the pg_notify that tells other processes to drop cached responses
+BUDGETS = {
+    "create_or_update_event: create": 8,
+    "create_or_update_event: unchanged": 10,
+    "create_or_update_event: update": 10,
+    "get_event_by_slug": 8,
+    "get_event_json": 1,
+}
+
+
+def payload(slug: str, title: str) -> schemas.EventCreate:
+    return schemas.EventCreate(
+        title=title,
+        slug=slug,
+        description="Описание",
+        status="scheduled",
+        organizer={"name": "Budget organizer"},
+        default_venue={"name": "Budget venue", "city": "Москва", "address": "ул. Тестовая, 1"},
+        tags=[{"name": f"budget-tag-{t}", "slug": f"budget-tag-{t}"} for t in range(3)],
+        occurrences=[{"start_time": datetime(2030, 1, d, 19, tzinfo=timezone.utc)} for d in range(1, 4)],
+        tickets=[{"name": f"Category {k}", "price": 1000 * (k + 1)} for k in range(2)],
+        images=[{"url": f"https://img.example.com/{slug}/{k}.jpg", "sort_order": k} for k in range(2)],
+        sources=[{"source_url": f"https://example.com/{slug}", "source_name": "budget", "fingerprint": slug}],
+    )
+
+
+async def run_case(name: str, action) -> bool:
+    budget = BUDGETS[name]
+    async with async_session_factory() as session:
+        try:
+            async with assert_max_queries(budget) as recorder:
+                await action(session)
+                await session.commit()  # pending changes are flushed here
+        except QueryBudgetExceeded as e:
+            print(f"FAIL {name}: {e}")
+            return False
+    print(f"ok   {name}: {recorder.count}/{budget} queries")
+    return True
+
+
+async def main():
+    await init_async_db()
+    slug = f"budget-{uuid.uuid4().hex[:8]}"
+    # Dimension ids are cached after the first write; warm them like a running app
+    warmup = f"{slug}-warmup"
+    async with async_session_factory() as session:
+        await event_service.create_or_update_event(session, payload(warmup, "Warm-up"))
+        await session.commit()
+
+    cases = [
+        ("create_or_update_event: create", lambda s: event_service.create_or_update_event(s, payload(slug, "Budget"))),
+        ("create_or_update_event: unchanged", lambda s: event_service.create_or_update_event(s, payload(slug, "Budget"))),
+        ("create_or_update_event: update", lambda s: event_service.create_or_update_event(s, payload(slug, "Changed"))),
+        ("get_event_by_slug", lambda s: event_service.get_event_by_slug(s, slug)),
+        ("get_event_json", lambda s: materialize.get_event_json(s, slug)),
+    ]
+    passed = [await run_case(name, action) for name, action in cases]
+    for removed in (slug, warmup):
+        async with async_session_factory() as session:
+            await event_service.delete_event(session, removed)
+            await session.commit()
+    if not all(passed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,187 @@
+"""
+Synthetic event catalogue for benchmarks, shaped like scraped listings.
+
+A few big cities hold most venues and events; within a city venue popularity, and
+organizer and tag popularity overall, follow Zipf laws (a handful of venues and tags
+appear everywhere, the long tail rarely). Most events are one-offs, some are short
+series and a few are long daily runs; 5% of series dates are at another venue (tours).
+Text lengths, ticket prices and image and source counts vary per event. Dates start
+from a fixed day, so the same seed and size always give the same payloads, whatever
+day the benchmark runs.
+
+    catalogue = Catalogue(events=10000, seed=42)
+    payloads = catalogue.events()  # JSON-ready dicts, as POST /events/batch takes them
+    models = catalogue.event_models(0, 1000)  # EventCreate, for calling the services directly
+"""
+import bisect
+import itertools
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import schemas
+
+BASE_DATE = datetime(2030, 1, 1, tzinfo=timezone.utc)
+HORIZON_DAYS = 180
+
+# name, share of venues and events, (lat, lon) of the centre
+CITIES = [
+    ("Москва", 0.40, (55.7558, 37.6173)),
+    ("Санкт-Петербург", 0.20, (59.9386, 30.3141)),
+    ("Казань", 0.07, (55.7963, 49.1088)),
+    ("Екатеринбург", 0.07, (56.8389, 60.6057)),
+    ("Новосибирск", 0.06, (55.0302, 82.9204)),
+    ("Нижний Новгород", 0.05, (56.3269, 44.0059)),
+    ("Краснодар", 0.05, (45.0355, 38.9753)),
+    ("Самара", 0.04, (53.1959, 50.1002)),
+    ("Ярославль", 0.03, (57.6261, 39.8845)),
+    ("Калининград", 0.03, (54.7104, 20.4522)),
+]
+CATEGORIES = ["Концерт", "Спектакль", "Выставка", "Стендап", "Лекция", "Фестиваль", "Мастер-класс", "Кино", "Экскурсия"]
+WORDS = (
+    "вечер музыка джаз классика рок премьера гастроли юбилей программа сезон ночь "
+    "история искусство оркестр квартет хор балет опера театр галерея авторский новый "
+    "большой малый летний зимний весенний осенний открытый городской камерный"
+).split()
+SOURCES = ["kudago", "yandex-afisha", "timepad", "ticketland", "radario"]
+STATUSES = [("scheduled", 0.86), ("draft", 0.04), ("cancelled", 0.04), ("postponed", 0.03), ("done", 0.03)]
+TICKET_NAMES = ["Стандарт", "Партер", "Балкон", "VIP", "Танцпол", "Студенческий", "Льготный"]
+
+
+class Zipf:
+    """Index in [0, n) with P(i) proportional to 1 / (i + 1) ** s."""
+
+    def __init__(self, n: int, s: float = 1.1):
+        self.cumulative = list(itertools.accumulate(1 / (i + 1) ** s for i in range(n)))
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+def weighted(rng: random.Random, choices: Sequence[tuple]) -> Any:
+    return rng.choices([c[0] for c in choices], weights=[c[1] for c in choices])[0]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def text(rng: random.Random, mean_chars: int) -> str:
+    """Roughly lognormal length around `mean_chars`."""
+    target = int(rng.lognormvariate(math.log(mean_chars), 0.6))
+    parts = []
+    while sum(len(p) + 1 for p in parts) < target:
+        parts.append(sentence(rng, rng.randint(6, 16)))
+    return " ".join(parts)
+
+
+class Catalogue:
+    def __init__(
+        self,
+        events: int = 10000,
+        venues: Optional[int] = None,
+        organizers: Optional[int] = None,
+        tags: int = 300,
+        seed: int = 42,
+        prefix: str = "bench",
+    ):
+        self.size = events
+        self.seed = seed
+        self.prefix = prefix
+        rng = random.Random(seed)
+        self.venues = self._venues(rng, venues or max(len(CITIES) * 2, events // 8))
+        self.organizers = [{"name": f"Организатор {i} {rng.choice(WORDS)}"} for i in range(organizers or max(10, events // 25))]
+        self.tags = [{"name": f"{rng.choice(WORDS)} {i}", "slug": f"{prefix}-tag-{i}"} for i in range(tags)]
+        self._city_venues = {city: [v for v in self.venues if v["city"] == city] for city, _, _ in CITIES}
+        self._city_venues = {city: venues for city, venues in self._city_venues.items() if venues}
+        self._city_weights = [dict((c[0], c[1]) for c in CITIES)[city] for city in self._city_venues]
+        self._venue_zipf = {city: Zipf(len(venues), 0.9) for city, venues in self._city_venues.items()}
+        self._organizer_zipf = Zipf(len(self.organizers))
+        self._tag_zipf = Zipf(len(self.tags), 1.0)
+
+    def _venues(self, rng: random.Random, count: int) -> List[Dict[str, Any]]:
+        venues = []
+        for i in range(count):
+            city, _, (lat, lon) = CITIES[i] if i < len(CITIES) else rng.choices(CITIES, weights=[c[1] for c in CITIES])[0]
+            distance = 15 * rng.random() ** 1.5 / 111.0  # degrees, denser in the centre
+            bearing = rng.uniform(0, 2 * math.pi)
+            venues.append({
+                "name": f"Площадка {i}",
+                "city": city,
+                "address": f"ул. {rng.choice(WORDS).capitalize()}, {rng.randint(1, 200)}",
+                "lat": round(lat + distance * math.cos(bearing), 6),
+                "lon": round(lon + distance * math.sin(bearing) / math.cos(math.radians(lat)), 6),
+            })
+        return venues
+
+    def venue(self, rng: random.Random, city: Optional[str] = None) -> Dict[str, Any]:
+        """A venue of `city` (default: a city drawn by weight), popular ones more often."""
+        city = city or rng.choices(list(self._city_venues), weights=self._city_weights)[0]
+        return self._city_venues[city][self._venue_zipf[city].sample(rng)]
+
+    def slug(self, i: int) -> str:
+        return f"{self.prefix}-event-{i}"
+
+    def event(self, i: int) -> Dict[str, Any]:
+        """Payload of event `i`; the same for a given catalogue seed, in any order of calls."""
+        rng = random.Random(self.seed * 1_000_003 + i)
+        venue = self.venue(rng)
+        category = rng.choice(CATEGORIES)
+        title = f"{category}: {sentence(rng, rng.randint(2, 6))[:-1]}"
+
+        kind = rng.random()
+        if kind < 0.60:
+            dates, step = 1, timedelta(days=1)
+        elif kind < 0.85:
+            dates, step = rng.randint(2, 5), timedelta(days=rng.choice([1, 7]))
+        elif kind < 0.95:
+            dates, step = rng.randint(6, 20), timedelta(days=7)
+        else:
+            dates, step = rng.randint(20, 60), timedelta(days=1)
+        start = BASE_DATE + timedelta(days=rng.randint(-14, HORIZON_DAYS), hours=rng.choice([11, 12, 15, 18, 19, 20]))
+        occurrences = []
+        for n in range(dates):
+            occurrence: Dict[str, Any] = {"start_time": (start + step * n).isoformat()}
+            if rng.random() < 0.5:
+                occurrence["end_time"] = (start + step * n + timedelta(hours=rng.choice([1, 2, 3]))).isoformat()
+            if dates > 1 and rng.random() < 0.05:
+                occurrence["venue"] = self.venue(rng)
+            occurrences.append(occurrence)
+
+        tag_ids = {self._tag_zipf.sample(rng) for _ in range(max(1, min(8, int(rng.expovariate(1 / 3)) + 1)))}
+        payload = {
+            "title": title[:255],
+            "slug": self.slug(i),
+            "description": text(rng, 300),
+            "full_text": text(rng, 2000) if rng.random() < 0.7 else None,
+            "age_restriction": rng.choice([0, 0, 0, 6, 12, 16, 18]),
+            "status": weighted(rng, STATUSES),
+            "organizer": self.organizers[self._organizer_zipf.sample(rng)] if rng.random() < 0.8 else None,
+            "default_venue": venue,
+            "tags": [self.tags[t] for t in sorted(tag_ids)],
+            "occurrences": occurrences,
+            "tickets": [
+                {"name": name, "price": round(rng.lognormvariate(math.log(1500), 0.7), -1)}
+                for name in rng.sample(TICKET_NAMES, rng.choice([0, 1, 1, 2, 3, 4]))
+            ],
+            "images": [
+                {"url": f"https://img.example.com/{self.prefix}/{i}/{k}.jpg", "sort_order": k}
+                for k in range(rng.choice([0, 1, 1, 2, 3, 5]))
+            ],
+            "sources": [
+                {"source_url": f"https://{source}.example.com/event/{i}", "source_name": source,
+                 "fingerprint": f"{self.prefix}-{source}-{i}"}
+                for source in rng.sample(SOURCES, rng.choice([1, 1, 1, 2]))
+            ],
+        }
+        return payload
+
+    def events(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [self.event(i) for i in range(start, self.size if stop is None else stop)]
+
+    def event_models(self, start: int = 0, stop: Optional[int] = None) -> List[schemas.EventCreate]:
+        return [schemas.EventCreate.model_validate(payload) for payload in self.events(start, stop)]
+
+    def popular_tags(self, n: int = 20) -> List[str]:
+        return [tag["slug"] for tag in self.tags[:n]]
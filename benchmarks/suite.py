@@ -0,0 +1,244 @@
+"""
+Reproducible benchmark suite for the ingest and read paths.
+
+Drives the FastAPI app in-process (httpx ASGI transport, no server or network) against
+the database in DATABASE_URL, with a synthetic catalogue from benchmarks.datagen:
+
+  ingest            POST /events/batch of the whole catalogue into empty tables (events/s)
+  resync            the same batches again, nothing changed (events/s)
+  resync_skip       the same with skip_unchanged=true, answered from content hashes
+  get_event         GET /events/{slug}, Zipf-popular slugs, response cache off (p50/p99)
+  get_event_cached  the same with the response cache on
+  list              GET /events/ filtered by status, popular tag and a date window
+  list_lean         the same with fields=title,slug,next_occurrence,primary_image
+
+Peak RSS of the process is recorded after every phase. Results go to a JSON file
+(parameters, git commit, Python and Postgres versions, one entry per phase) so runs
+can be compared with --compare. The tables must be empty: --truncate empties them first.
+
+Usage (DATABASE_URL must point at a disposable database; needs requirements-dev.txt):
+    python -m benchmarks.suite --events 10000 --truncate
+    python -m benchmarks.suite --events 10000 --truncate --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import func, select, text
+
+from benchmarks.datagen import BASE_DATE, HORIZON_DAYS, Catalogue, Zipf
+from database import async_session_factory, init_async_db
+from db import models
+from services import response_cache
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+TABLES = (
+    "events, organizers, venues, tags, event_tags, event_occurrences, ticket_types, "
+    "event_images, event_sources, event_embeddings, event_neighbors, ingest_jobs"
+)
+
+
+def peak_rss_mib() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024  # bytes on macOS, KiB on Linux
+
+
+def git_commit() -> Optional[str]:
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=root) != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)],
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+CACHE_SIZES = {name: cache.maxsize for name, cache in response_cache.CACHES.items()}
+
+
+def set_response_cache(enabled: bool) -> None:
+    """Empty the response caches; a maxsize of 0 keeps them from storing anything."""
+    for name, cache in response_cache.CACHES.items():
+        cache.clear()
+        cache.maxsize = CACHE_SIZES[name] if enabled else 0
+
+
+async def prepare_database(truncate: bool) -> None:
+    await init_async_db()
+    async with async_session_factory() as session:
+        if truncate:
+            await session.execute(text(f"TRUNCATE {TABLES} RESTART IDENTITY CASCADE"))
+            await session.commit()
+        stored = (await session.execute(select(func.count()).select_from(models.Event))).scalar()
+    if stored:
+        raise SystemExit(f"{stored} events already stored; run against an empty database or pass --truncate")
+
+
+async def analyze() -> None:
+    async with async_session_factory() as session:
+        await session.execute(text("ANALYZE"))
+        await session.commit()
+
+
+async def ingest(client: httpx.AsyncClient, catalogue: Catalogue, batch: int, **params) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    elapsed = 0.0
+    for start in range(0, catalogue.size, batch):
+        payloads = catalogue.events(start, min(catalogue.size, start + batch))
+        started = time.perf_counter()
+        response = await client.post("/events/batch", json=payloads, params=params)
+        elapsed += time.perf_counter() - started
+        response.raise_for_status()
+        for key, value in response.json().items():
+            if isinstance(value, list):
+                counts[key] = counts.get(key, 0) + len(value)
+    return {"events": catalogue.size, "seconds": elapsed, "events_per_s": catalogue.size / elapsed, **counts}
+
+
+async def read_events(client: httpx.AsyncClient, catalogue: Catalogue, requests: int, rng: random.Random):
+    popularity = Zipf(catalogue.size, 0.8)
+    slugs = [catalogue.slug(popularity.sample(rng)) for _ in range(requests)]
+    latencies = []
+    for slug in slugs:
+        started = time.perf_counter()
+        response = await client.get(f"/events/{slug}")
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latency_summary(latencies)
+
+
+def list_queries(catalogue: Catalogue, requests: int, rng: random.Random, lean: bool) -> List[Dict[str, Any]]:
+    tags = catalogue.popular_tags(30)
+    tag_popularity = Zipf(len(tags), 1.0)
+    queries = []
+    for _ in range(requests):
+        start = BASE_DATE + timedelta(days=rng.randint(0, HORIZON_DAYS - 7))
+        query = {
+            "status": "scheduled",
+            "tag_slug": tags[tag_popularity.sample(rng)],
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rng.choice([1, 7, 30]))).isoformat(),
+            "order": "start_time",
+            "limit": 20,
+        }
+        if lean:
+            query["fields"] = "title,slug,next_occurrence,primary_image"
+        queries.append(query)
+    return queries
+
+
+async def read_lists(client: httpx.AsyncClient, queries: List[Dict[str, Any]]):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        response = await client.get("/events/", params=query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latency_summary(latencies)
+
+
+async def postgres_version() -> str:
+    async with async_session_factory() as session:
+        return (await session.execute(text("SHOW server_version"))).scalar()
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    print(f"\ncompared with {previous.get('git_commit')} ({previous.get('started_at')})")
+    ignored = ("output", "compare", "truncate")
+    for name, value in current["parameters"].items():
+        if name not in ignored and previous.get("parameters", {}).get(name) != value:
+            print(f"warning: --{name.replace('_', '-')} differs ({previous['parameters'].get(name)} -> {value})")
+    print(f"{'phase':<18}{'metric':<14}{'before':>12}{'after':>12}{'change':>10}")
+    for phase, result in current["phases"].items():
+        before = previous.get("phases", {}).get(phase, {})
+        for metric in ("events_per_s", "p50_ms", "p99_ms", "peak_rss_mib"):
+            if metric in result and metric in before and before[metric]:
+                change = (result[metric] - before[metric]) / before[metric]
+                print(f"{phase:<18}{metric:<14}{before[metric]:>12.2f}{result[metric]:>12.2f}{change:>+10.1%}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000, help="catalogue size")
+    parser.add_argument("--venues", type=int, help="default: events / 8")
+    parser.add_argument("--organizers", type=int, help="default: events / 25")
+    parser.add_argument("--tags", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=500, help="events per POST /events/batch")
+    parser.add_argument("--reads", type=int, default=2000, help="requests per read phase")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty all event tables first")
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    # Imported here: the app reads its settings (metrics, profiling) at import time
+    from main import app
+
+    await prepare_database(args.truncate)
+    catalogue = Catalogue(args.events, args.venues, args.organizers, args.tags, seed=args.random_seed)
+    results: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "postgres": await postgres_version(),
+        "parameters": vars(args),
+        "phases": {},
+    }
+
+    async def phase(name: str, run):
+        rng = random.Random(f"{args.random_seed}-{name}")
+        result = await run(rng)
+        result["peak_rss_mib"] = peak_rss_mib()
+        results["phases"][name] = result
+        shown = {k: round(v, 2) if isinstance(v, float) else v for k, v in result.items()}
+        print(f"{name:<18}{shown}", flush=True)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        set_response_cache(False)
+        await phase("ingest", lambda rng: ingest(client, catalogue, args.batch))
+        await analyze()
+        await phase("resync", lambda rng: ingest(client, catalogue, args.batch))
+        await phase("resync_skip", lambda rng: ingest(client, catalogue, args.batch, skip_unchanged="true"))
+        await phase("get_event", lambda rng: read_events(client, catalogue, args.reads, rng))
+        await phase("list", lambda rng: read_lists(client, list_queries(catalogue, args.reads, rng, lean=False)))
+        await phase("list_lean", lambda rng: read_lists(client, list_queries(catalogue, args.reads, rng, lean=True)))
+        set_response_cache(True)
+        await phase("get_event_cached", lambda rng: read_events(client, catalogue, args.reads, rng))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['git_commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
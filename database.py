@@ -1,31 +1,224 @@
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from db.models import Base
+from db.models import Base, SEARCH_VECTOR_SQL
+from services import metrics, profiling, replica, response_cache, similar
+import hashlib
 import os
+import logging
+import re
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 # Use asyncpg driver
 DATABASE_URL = os.getenv("DATABASE_URL").replace("postgresql://", "postgresql+asyncpg://")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Connection pools. Every process opens up to (DB_POOL_SIZE + DB_MAX_OVERFLOW) plus
+# (DB_INGEST_POOL_SIZE + DB_INGEST_MAX_OVERFLOW) connections, and one for
+# services.response_cache.listener; with several uvicorn
+# workers that times WEB_CONCURRENCY must stay below the server's max_connections.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # seconds, -1: never
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+# Prepared statements cached per connection (asyncpg's and SQLAlchemy's caches).
+# Set to 0 behind PgBouncer in transaction mode.
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Bulk writes (batches, NDJSON ingest, jobs, embeddings, similar-event refreshes) get
+# their own pool so a large batch cannot take every connection from API reads.
+# DB_INGEST_POOL_SIZE=0 runs them on the main pool.
+INGEST_POOL_SIZE = int(os.getenv("DB_INGEST_POOL_SIZE", "3"))
+INGEST_MAX_OVERFLOW = int(os.getenv("DB_INGEST_MAX_OVERFLOW", "2"))
+INGEST_POOL_TIMEOUT = float(os.getenv("DB_INGEST_POOL_TIMEOUT", str(POOL_TIMEOUT)))
+# Optional streaming replica for read-only handlers (services.replica)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "").replace("postgresql://", "postgresql+asyncpg://")
+REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", str(POOL_SIZE)))
+REPLICA_MAX_OVERFLOW = int(os.getenv("DB_REPLICA_MAX_OVERFLOW", str(MAX_OVERFLOW)))
+
+
+def make_engine(
+    url: str, name: str, pool_size: int, max_overflow: int, pool_timeout: float, pre_ping: bool = POOL_PRE_PING
+):
+    """Engine with a named, instrumented pool (`name` labels its metrics)."""
+    pooled = create_async_engine(
+        url,
+        echo=False,
+        poolclass=metrics.TimedQueuePool,
+        pool_logging_name=name,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=pre_ping,
+        connect_args={
+            "statement_cache_size": STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": STATEMENT_CACHE_SIZE,
+        },
+    )
+    metrics.instrument_engine(pooled, name)
+    profiling.instrument_engine(pooled)
+    return pooled
+
+
+def make_session_factory(bind) -> async_sessionmaker:
+    return async_sessionmaker(bind, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+
+engine = make_engine(DATABASE_URL, "main", POOL_SIZE, MAX_OVERFLOW, POOL_TIMEOUT)
+async_session_factory = make_session_factory(engine)
+
+if INGEST_POOL_SIZE > 0:
+    ingest_engine = make_engine(DATABASE_URL, "ingest", INGEST_POOL_SIZE, INGEST_MAX_OVERFLOW, INGEST_POOL_TIMEOUT)
+    ingest_session_factory = make_session_factory(ingest_engine)
+else:
+    ingest_engine = engine
+    ingest_session_factory = async_session_factory
+
+if DATABASE_REPLICA_URL:
+    # Pre-pinged, so connections left dead by a replica restart are replaced at checkout
+    replica_engine = make_engine(
+        DATABASE_REPLICA_URL, "replica", REPLICA_POOL_SIZE, REPLICA_MAX_OVERFLOW, POOL_TIMEOUT, pre_ping=True
+    )
+    replica_session_factory = make_session_factory(replica_engine)
+else:
+    replica_engine = None
+    replica_session_factory = None
+
+
+@asynccontextmanager
+async def read_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only work: on the replica while it is up and within
+    REPLICA_MAX_LAG_SECONDS, else on the primary. The replica connection is taken
+    up front, so a replica that cannot be reached falls back to the primary too.
+    Anything that must see its own writes uses async_session_factory.
+    """
+    session = None
+    if replica_session_factory is not None and replica.monitor.usable:
+        session = replica_session_factory()
+        try:
+            await session.connection()
+        except (DBAPIError, OSError) as e:
+            await session.close()
+            replica.monitor.mark_down(str(e))
+            session = None
+    async with session or async_session_factory() as session:
+        yield session
+
 
-async_session_factory = async_sessionmaker(
-    engine, 
-    class_=AsyncSession, 
-    expire_on_commit=False, 
-    autoflush=False
-)
+def from_replica(session: AsyncSession) -> bool:
+    return replica_engine is not None and session.bind is replica_engine
+
+# create_all only creates missing tables, so columns and indexes added to existing
+# tables are applied here. Every statement must be idempotent.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    # Fails (and is skipped with a warning) while duplicate organizers/venues exist;
+    # dimension inserts then still work, just without race protection.
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_organizer_name ON organizers (name)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_venue_name_city ON venues (name, city)",
+    "CREATE INDEX IF NOT EXISTS idx_occurrence_start ON event_occurrences (start_time, id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_embedding_event_model ON event_embeddings (event_id, model_name)",
+    "ALTER TABLE event_sources ADD COLUMN IF NOT EXISTS merged_from VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_event_sources_merged_from ON event_sources (merged_from)",
+    f"ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS idx_event_search ON events USING gin (search_vector)",
+    # Failed slugs of a job, in full: `errors` is truncated. Jobs from before the column
+    # get theirs from `errors`.
+    "ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS failed_slugs VARCHAR[]",
+    "UPDATE ingest_jobs SET failed_slugs = ARRAY(SELECT e->>'slug' FROM jsonb_array_elements(errors) AS e WHERE e->>'slug' IS NOT NULL) WHERE failed_slugs IS NULL",
+    # Substring search (ILIKE '%...%') on tags and organizers. Skipped with a warning
+    # where pg_trgm is not available; the queries then still work, unindexed.
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_tag_name_trgm ON tags USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_organizer_name_trgm ON organizers USING gin (name gin_trgm_ops)",
+    # Events near a point: venues by location, then their occurrences and events
+    "CREATE INDEX IF NOT EXISTS idx_venue_location ON venues USING gist (point(lon, lat))",
+    "CREATE INDEX IF NOT EXISTS idx_occurrence_venue ON event_occurrences (venue_id, start_time)",
+    "CREATE INDEX IF NOT EXISTS ix_events_venue_id ON events (venue_id)",
+]
+
+# One partial ANN index per embedding model: vectors of different models are not
+# comparable, so every search is restricted to one model_name anyway.
+VECTOR_INDEX_MODELS = [m.strip() for m in os.getenv("VECTOR_INDEX_MODELS", "").split(",") if m.strip()]
+# The similar-events refresh runs a nearest-neighbour query per changed event, which
+# without an index is a scan over all the model's embeddings
+if similar.SIMILAR_MODEL and similar.SIMILAR_MODEL not in VECTOR_INDEX_MODELS:
+    VECTOR_INDEX_MODELS.append(similar.SIMILAR_MODEL)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")  # hnsw | ivfflat
+VECTOR_IVFFLAT_LISTS = int(os.getenv("VECTOR_IVFFLAT_LISTS", "100"))
+
+
+def vector_index_name(model_name: str, index_type: str) -> str:
+    suffix = re.sub(r"[^a-z0-9]+", "_", model_name.lower()).strip("_")[:30]
+    digest = hashlib.md5(model_name.encode("utf-8")).hexdigest()[:8]
+    return f"idx_embedding_{index_type}_{suffix}_{digest}"
+
+
+def vector_index_statement(model_name: str, index_type: str = None) -> str:
+    """
+    CREATE INDEX for cosine search over the embeddings of `model_name`. IVFFlat picks
+    its centroids from the rows present at build time, so build it after loading data.
+    """
+    index_type = index_type or VECTOR_INDEX_TYPE
+    if index_type not in ("hnsw", "ivfflat"):
+        raise ValueError(f"unknown vector index type: {index_type}")
+    literal = model_name.replace("'", "''")
+    options = f" WITH (lists = {VECTOR_IVFFLAT_LISTS})" if index_type == "ivfflat" else ""
+    return (
+        f"CREATE INDEX IF NOT EXISTS {vector_index_name(model_name, index_type)} "
+        f"ON event_embeddings USING {index_type} (embedding vector_cosine_ops){options} "
+        f"WHERE model_name = '{literal}'"
+    )
+
+
+SCHEMA_UPGRADES += [vector_index_statement(model_name) for model_name in VECTOR_INDEX_MODELS]
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_factory() as session:
         yield session
 
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session() as session:
+        yield session
+
+async def get_ingest_session() -> AsyncGenerator[AsyncSession, None]:
+    async with ingest_session_factory() as session:
+        yield session
+
+def max_connections_per_process() -> int:
+    total = POOL_SIZE + max(0, MAX_OVERFLOW)
+    if ingest_engine is not engine:
+        total += INGEST_POOL_SIZE + max(0, INGEST_MAX_OVERFLOW)
+    if response_cache.NOTIFY_ENABLED:
+        total += 1  # the cache invalidation listener's own connection
+    return total  # the replica's connections count against the replica server
+
 async def init_async_db():
     async with engine.begin() as conn:
         # Create tables if they don't exist (useful for testing/first run)
         # In production, use Alembic
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(text(statement))
+            except Exception as e:
+                logger.warning(f"Schema upgrade skipped ({statement}): {e}")
+        server_limit = int((await conn.execute(text("SHOW max_connections"))).scalar())
+    if not similar.SIMILAR_MODEL:
+        logger.warning("SIMILAR_EVENTS_MODEL is not set: similar events are not computed and /events/{slug}/similar returns []")
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    wanted = workers * max_connections_per_process()
+    if wanted > server_limit:
+        logger.warning(
+            f"Connection pools allow {wanted} connections ({workers} worker(s)), "
+            f"more than the server's max_connections={server_limit}; lower the DB_*POOL_SIZE/DB_*MAX_OVERFLOW settings"
+        )
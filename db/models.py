@@ -4,10 +4,10 @@ from datetime import datetime
 
 from sqlalchemy import (
     String, ForeignKey, Text, DateTime, Float, Integer, 
-    Boolean, Enum as PgEnum, Index, func
+    Boolean, Enum as PgEnum, Index, Computed, func, text
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TIMESTAMP, TSVECTOR
 from pgvector.sqlalchemy import Vector
 from .database import Base
 
@@ -22,6 +22,7 @@ class EventStatus(str, enum.Enum):
 # --- Организатор ---
 class Organizer(Base):
     __tablename__ = "organizers"
+    __table_args__ = (Index('uq_organizer_name', "name", unique=True),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(150), index=True)
@@ -36,6 +37,11 @@ class Organizer(Base):
 # --- Место проведения ---
 class Venue(Base):
     __tablename__ = "venues"
+    __table_args__ = (
+        Index('uq_venue_name_city', "name", "city", unique=True),
+        # Поиск "рядом со мной": GiST по точке (lon, lat), запросы по bounding box
+        Index('idx_venue_location', text("point(lon, lat)"), postgresql_using="gist"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(150))
@@ -62,9 +68,17 @@ class EventTag(Base):
     event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
     tag_id: Mapped[int] = mapped_column(ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
 
+# Вес A — заголовок, B — краткое описание, C — полный текст
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(full_text, '')), 'C')"
+)
+
 # --- ГЛАВНАЯ СУЩНОСТЬ: Event ---
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (Index('idx_event_search', "search_vector", postgresql_using="gin"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(255), index=True)
@@ -82,10 +96,14 @@ class Event(Base):
     # Метаданные создания
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True) # Хеш входного payload, чтобы пропускать неизменённые
+
+    # Полнотекстовый поиск: считается самим Postgres, в ORM не грузится
+    search_vector = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True), deferred=True)
 
     # Внешние ключи (Основной организатор и Дефолтная площадка)
     organizer_id: Mapped[Optional[int]] = mapped_column(ForeignKey("organizers.id"))
-    venue_id: Mapped[Optional[int]] = mapped_column(ForeignKey("venues.id"))
+    venue_id: Mapped[Optional[int]] = mapped_column(ForeignKey("venues.id"), index=True)
 
     # === RELATIONSHIPS (СВЯЗИ) ===
     # cascade="all, delete-orphan" означает: если удалить ивент, удалятся все его билеты, картинки и расписание
@@ -107,7 +125,13 @@ class Event(Base):
 # Для повторяющихся событий или точного времени проведения
 class EventOccurrence(Base):
     __tablename__ = "event_occurrences"
-    __table_args__ = (Index('idx_event_time', "event_id", "start_time", unique=True),)
+    __table_args__ = (
+        Index('idx_event_time', "event_id", "start_time", unique=True),
+        # Для выборок по окну дат (timeline): range scan по времени без join-а по событиям
+        Index('idx_occurrence_start', "start_time", "id"),
+        # Сеансы на площадке (переопределение venue_id) по времени — для поиска рядом
+        Index('idx_occurrence_venue', "venue_id", "start_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
@@ -170,6 +194,8 @@ class EventSource(Base):
     fingerprint: Mapped[str] = mapped_column(String, index=True) # Хеш для дедупликации
     
     raw_payload: Mapped[dict] = mapped_column(JSONB, nullable=True) # Сырой ответ источника
+    # Slug дубликата с другого сайта, слитого в это событие (NULL — собственный источник)
+    merged_from: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
 
     event: Mapped["Event"] = relationship(back_populates="sources")
 
@@ -177,6 +203,8 @@ class EventSource(Base):
 # Вынесены отдельно, чтобы поддерживать разные модели (OpenAI, BERT, RuBERT)
 class EventEmbedding(Base):
     __tablename__ = "event_embeddings"
+    # Один вектор на (событие, модель): загрузка заменяет старый
+    __table_args__ = (Index('uq_embedding_event_model', "event_id", "model_name", unique=True),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
@@ -191,4 +219,46 @@ class EventEmbedding(Base):
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
-    event: Mapped["Event"] = relationship(back_populates="embeddings")
\ No newline at end of file
+    event: Mapped["Event"] = relationship(back_populates="embeddings")
+
+# --- Похожие события (Similar events) ---
+# Предрассчитанные top-k соседей: косинусная близость эмбеддингов + общие теги + тот же город.
+# Пересчитываются только для изменившихся событий (services/similar.py).
+class EventNeighbor(Base):
+    __tablename__ = "event_neighbors"
+
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True) # 1 = самый похожий
+    neighbor_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), index=True)
+    score: Mapped[float] = mapped_column(Float)
+
+# --- Фоновые задачи загрузки (Ingest jobs) ---
+# Очередь в самом Postgres: воркеры забирают задачи через FOR UPDATE SKIP LOCKED,
+# поэтому очередь переживает рестарт и не требует отдельного брокера (services/jobs.py).
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (
+        # Только живые задачи: выборка следующей задачи не читает историю
+        Index('idx_ingest_job_active', "id", postgresql_where=text("status IN ('queued', 'running')")),
+        # Поиск более новых задач с теми же slug-ами (их payload важнее)
+        Index('idx_ingest_job_slugs', "slugs", postgresql_using="gin"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), default="queued") # queued, running, done, failed
+    options: Mapped[dict] = mapped_column(JSONB, default=dict) # skip_unchanged, dedupe
+    payload: Mapped[list] = mapped_column(JSONB) # События (по одному на slug, побеждает последний)
+    slugs: Mapped[List[str]] = mapped_column(ARRAY(String))
+
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0) # Сколько событий payload уже пройдено
+    coalesced: Mapped[int] = mapped_column(Integer, default=0) # Повторы slug-ов, отброшенные при постановке
+    counts: Mapped[dict] = mapped_column(JSONB, default=dict) # created / updated / skipped / merged / superseded / failed
+    errors: Mapped[list] = mapped_column(JSONB, default=list) # [{"slug", "error"}]
+    failed_slugs: Mapped[List[str]] = mapped_column(ARRAY(String), default=list) # Все отклонённые slug-и (errors обрезается)
+
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True) # Аренда воркера
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -1,7 +1,8 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from database import init_async_db
+from database import engine, init_async_db, ingest_session_factory, replica_engine
 from routers import events
+from services import jobs, metrics, profiling, replica, response_cache
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -12,10 +13,22 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Initializing Database...")
     await init_async_db()
+    jobs.pool.start(ingest_session_factory)
+    if replica_engine is not None:
+        replica.monitor.start(replica_engine)
+    if response_cache.NOTIFY_ENABLED:
+        response_cache.listener.start(engine.url.set(drivername="postgresql").render_as_string(hide_password=False))
     yield
     # Shutdown
+    await jobs.pool.stop()
+    await replica.monitor.stop()
+    await response_cache.listener.stop()
 
 app = FastAPI(title="Event Parser API", lifespan=lifespan)
+if profiling.MODE != "off":
+    app.add_middleware(profiling.ProfilingMiddleware)
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(events.router)
 
@@ -23,6 +36,24 @@ app.include_router(events.router)
 def health_check():
     return {"status": "ok", "version": "0.1.0"}
 
+@app.get("/health/pools")
+def pool_health():
+    """
+    Database connection pools: size, checked out, idle, waiting checkouts, utilisation
+    and timeouts. `busy` when checkouts are waiting for a connection. `replica` tells
+    whether reads currently go to the read replica and how far it is behind.
+    """
+    pools = metrics.pool_stats()
+    busy = any(pool["waiting"] for pool in pools.values())
+    return {"status": "busy" if busy else "ok", "pools": pools, "replica": replica.monitor.stats()}
+
+from fastapi.responses import PlainTextResponse
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 from fastapi import Request
 from fastapi.responses import JSONResponse
 import traceback
@@ -1,32 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status, Body
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
-from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from datetime import datetime
+from dataclasses import asdict
+import json
+from pydantic import TypeAdapter
 
-from database import get_async_session
+from database import (
+    get_async_session, get_ingest_session, get_read_session,
+    from_replica, ingest_session_factory, read_session,
+)
 import schemas
 from db import models
 from services import events as event_service
+from services import bulk as bulk_service
+from services import materialize
+from services import ingest as ingest_service
+from services import dedup, dimensions, replica, response_cache, singleflight
+from services import vector as vector_service
+from services import embeddings as embedding_service
+from services import similar as similar_service
+from services import search as search_service
+from services import geo as geo_service
+from services import jobs as jobs_service
 
 router = APIRouter(prefix="/events", tags=["events"])
 
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that may be sent while the handler still reads the request body.
+    The stock class listens on `receive` for disconnects, which on ASGI < 2.4 servers
+    (uvicorn) swallows the remaining body messages; disconnects surface from
+    request.stream() instead.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
 @router.post("/", response_model=schemas.EventResponse, status_code=status.HTTP_201_CREATED, 
              summary="Create or Upsert an Event", 
              description="Create a new event or update if it exists (by slug).")
 async def create_event(
     event: schemas.EventCreate,
+    background_tasks: BackgroundTasks,
+    dedupe: bool = False,
     session: AsyncSession = Depends(get_async_session)
 ):
     """
     Create a new event. If an event with the same slug exists, it will be updated (upsert behavior).
+    With `dedupe=true`, a new slug that duplicates an event from another source (same
+    rules as `/batch`) is merged into that event instead; the response is then that
+    event with `200` and its path in `Content-Location`.
     """
     try:
-        db_event = await event_service.create_or_update_event(session, event)
+        canonical = None
+        if dedupe:
+            result = await bulk_service.bulk_upsert_events(session, [event], dedupe=True)
+            canonical = result.merged[0].canonical if result.merged else None
+        else:
+            await event_service.create_or_update_event(session, event)
         await session.commit()
-        # Refresh to load relationships for response
-        return await event_service.get_event_by_slug(session, db_event.slug)
+        if canonical is not None:
+            body = await materialize.get_event_json(session, canonical)
+            return Response(
+                content=body, media_type="application/json", headers={"Content-Location": f"{router.prefix}/{canonical}"}
+            )
+        background_tasks.add_task(similar_service.refresh_neighbors, ingest_session_factory, [event.slug])
+        body = await materialize.get_event_json(session, event.slug)
+        return Response(content=body, media_type="application/json", status_code=status.HTTP_201_CREATED)
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create event: {str(e)}")
@@ -35,6 +81,7 @@ async def create_event(
 async def update_event(
     slug: str,
     event: schemas.EventCreate,
+    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_async_session)
 ):
     """
@@ -50,7 +97,9 @@ async def update_event(
     try:
         db_event = await event_service.create_or_update_event(session, event)
         await session.commit()
-        return await event_service.get_event_by_slug(session, db_event.slug)
+        background_tasks.add_task(similar_service.refresh_neighbors, ingest_session_factory, [db_event.slug])
+        body = await materialize.get_event_json(session, db_event.slug)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update event: {str(e)}")
@@ -71,71 +120,284 @@ async def delete_event(
 
 @router.get("/", response_model=List[schemas.EventResponse], summary="List Events")
 async def get_events(
-    skip: int = 0, 
-    limit: int = 100, 
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1),
     start_date: datetime = None,
     end_date: datetime = None,
     status: schemas.EventStatus = None,
     tag_slug: str = None,
-    session: AsyncSession = Depends(get_async_session)
+    cursor: Optional[str] = None,
+    order: schemas.EventOrder = schemas.EventOrder.id,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
 ):
     """
     Get list of events with pagination and filters.
+
+    Prefer keyset pagination over `skip`: pass the `X-Next-Cursor` header of a page
+    as `cursor` to fetch the next one (the header is absent on the last page).
+
+    With `fields` and/or `include` (comma-separated) the items are lean `EventSummary`
+    objects: `id` plus the requested columns (e.g. `title,slug,next_occurrence,primary_image`)
+    and relationships (e.g. `tags,organizer`). Nothing else is loaded.
+
+    Pages are served from the response cache until an event changes; send the `ETag`
+    back as `If-None-Match` to get `304 Not Modified`. Identical concurrent misses
+    share a single load.
     """
-    stmt = (
-        select(models.Event)
-        .order_by(models.Event.start_time.asc() if hasattr(models.Event, 'start_time') else models.Event.id.desc())
-        .options(
-             selectinload(models.Event.organizer),
-             selectinload(models.Event.default_venue),
-             selectinload(models.Event.tags),
-             selectinload(models.Event.occurrences).selectinload(models.EventOccurrence.venue),
-             selectinload(models.Event.tickets),
-             selectinload(models.Event.images),
-             selectinload(models.Event.sources)
-        )
+    filters = dict(
+        limit=limit,
+        skip=skip,
+        cursor=cursor,
+        order=order,
+        status=status,
+        tag_slug=tag_slug,
+        start_date=start_date,
+        end_date=end_date,
     )
-    
-    # Apply filters
-    if status:
-        stmt = stmt.where(models.Event.status == status)
-    
-    if tag_slug:
-        stmt = stmt.join(models.Event.tags).where(models.Tag.slug == tag_slug)
-
-    if start_date or end_date:
-        stmt = stmt.join(models.Event.occurrences)
-        if start_date:
-            stmt = stmt.where(models.EventOccurrence.start_time >= start_date)
-        if end_date:
-            stmt = stmt.where(models.EventOccurrence.start_time <= end_date)
-        
-    stmt = stmt.offset(skip).limit(limit).execution_options(populate_existing=True)
+    fields, include = _split_csv(fields), _split_csv(include)
+    key = (
+        tuple(sorted(filters.items())),
+        tuple(sorted(fields or ())),
+        tuple(sorted(include or ())),
+    )
+    cache = response_cache.list_cache
+    entry = cache.get(key)
+    if entry is None:
+        try:
+            entry = await singleflight.list_flight.do(
+                (key, cache.generation), lambda: _load_list(key, fields, include, filters)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return _cached_response(request, cache, entry)
 
-    result = await session.execute(stmt)
-    events = result.scalars().unique().all()
-    return events
+
+async def _load_list(key, fields, include, filters) -> response_cache.CachedResponse:
+    # Shared by every coalesced request, so it owns its session
+    cache = response_cache.list_cache
+    generation = cache.generation
+    async with read_session() as session:
+        cacheable = _cacheable(session, cache)
+        if fields or include:
+            items, next_cursor = await event_service.list_event_summaries(
+                session, fields=fields, include=include, **filters
+            )
+            body = JSONResponse(items).body
+        else:
+            events, next_cursor = await event_service.list_events(session, **filters)
+            body = EVENT_LIST.dump_json(EVENT_LIST.validate_python(events, from_attributes=True))
+    entry = response_cache.CachedResponse(
+        body, response_cache.body_etag(body), {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    )
+    if cacheable:
+        cache.put(key, entry, generation)
+    return entry
+
+
+EVENT_LIST = TypeAdapter(List[schemas.EventResponse])
+
+
+def _cacheable(session: AsyncSession, cache: response_cache.ResponseCache) -> bool:
+    # A replica that has not replayed the write behind the last invalidation may
+    # return the old data: serve it, but do not cache it
+    return not from_replica(session) or replica.monitor.caught_up(cache.invalidated_at)
+
+
+def _cached_response(request: Request, cache: response_cache.ResponseCache, entry: response_cache.CachedResponse) -> Response:
+    headers = {"ETag": entry.etag, **entry.headers}
+    if response_cache.etag_matches(request.headers.get("if-none-match"), entry.etag):
+        cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _split_csv(value: Optional[str]) -> Optional[set]:
+    if not value:
+        return None
+    return {part.strip() for part in value.split(",") if part.strip()}
+
+
+@router.get("/timeline", response_model=List[schemas.TimelineItem], summary="Upcoming Occurrences")
+async def get_timeline(
+    response: Response,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    status: schemas.EventStatus = None,
+    tag_slug: str = None,
+    city: str = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    What's on between `start_date` (default now) and `end_date`: occurrences sorted by
+    start time, each with its event summary. Paginate with the `X-Next-Cursor` header.
+    """
+    try:
+        items, next_cursor = await event_service.list_timeline(
+            session,
+            limit=limit,
+            cursor=cursor,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            tag_slug=tag_slug,
+            city=city,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+@router.get("/nearby", response_model=List[schemas.NearbyItem], summary="Events Near a Point")
+async def get_nearby(
+    response: Response,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=geo_service.MAX_RADIUS_KM),
+    order: str = Query("distance", pattern="^(distance|start_time)$"),
+    start_date: datetime = None,
+    end_date: datetime = None,
+    status: schemas.EventStatus = None,
+    tag_slug: str = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Upcoming occurrences at venues within `radius_km` of (`lat`, `lon`), nearest first
+    or (`order=start_time`) soonest first. An occurrence's own venue overrides the
+    event's default one. Paginate with the `X-Next-Cursor` header.
+    """
+    try:
+        items, next_cursor = await geo_service.list_nearby(
+            session,
+            lat=lat,
+            lon=lon,
+            radius_km=radius_km,
+            order=order,
+            limit=limit,
+            cursor=cursor,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            tag_slug=tag_slug,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+@router.post("/search/vector", response_model=List[schemas.VectorSearchHit], summary="Vector Similarity Search")
+async def search_vector(
+    query: schemas.VectorSearchRequest,
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    The `k` events whose `model_name` embedding is closest (cosine) to `vector`, nearest
+    first, optionally filtered by status, tag and dates. Served by the model's ANN index;
+    with selective filters raise `ef_search` (HNSW) or `probes` (IVFFlat) to keep `k` hits.
+    """
+    try:
+        body = await vector_service.search_events_json(
+            session,
+            query.vector,
+            query.model_name,
+            k=query.k,
+            ef_search=query.ef_search,
+            probes=query.probes,
+            status=query.status,
+            tag_slug=query.tag_slug,
+            start_date=query.start_date,
+            end_date=query.end_date,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/export", summary="Export Events as NDJSON",
+            response_class=StreamingResponse,
+            responses={200: {"content": {"application/x-ndjson": {}}}})
+async def export_events(
+    start_date: datetime = None,
+    end_date: datetime = None,
+    status: schemas.EventStatus = None,
+    tag_slug: str = None,
+):
+    """
+    Stream every matching event as newline-delimited JSON (one EventResponse document
+    per line, in id order). Rows are read through a server-side cursor in chunks, so
+    memory stays flat no matter how large the catalogue is.
+    """
+    async def lines():
+        # The stream outlives the request scope, so it owns its session
+        async with read_session() as session:
+            async for chunk in materialize.stream_event_documents(
+                session, status=status, tag_slug=tag_slug, start_date=start_date, end_date=end_date
+            ):
+                yield chunk
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/search", response_model=List[schemas.EventSearchHit], summary="Search Events")
+async def search_events(
+    q: str = Query(..., min_length=1, max_length=200),
+    prefix: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    start_date: datetime = None,
+    end_date: datetime = None,
+    status: schemas.EventStatus = None,
+    tag_slug: str = None,
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Full-text search in title, description and full text (Russian stemming), best
+    matches first. `q` accepts web-search syntax: `"exact phrase"`, `or`, `-exclude`.
+    With `prefix=true` every word matches as a prefix, for autocomplete.
+    """
+    try:
+        hits = await search_service.search_events(
+            session, q, prefix=prefix, limit=limit, skip=skip,
+            status=status, tag_slug=tag_slug, start_date=start_date, end_date=end_date,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [{"rank": rank, "event": event} for rank, event in hits]
 
 
 @router.get("/tags", response_model=List[schemas.TagSchema], summary="List Tags")
 async def get_tags(
     search: str = None,
     limit: int = 100,
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
+    # Substring match, served by the idx_tag_name_trgm trigram index
     stmt = select(models.Tag).limit(limit)
     if search:
-        stmt = stmt.where(models.Tag.name.ilike(f"%{search}%"))
+        stmt = stmt.where(models.Tag.name.icontains(search, autoescape=True))
     result = await session.execute(stmt)
     return result.scalars().all()
 
 
 @router.get("/organizers", response_model=List[schemas.OrganizerSchema], summary="List Organizers")
 async def get_organizers(
+    search: str = None,
     limit: int = 100, 
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
+    # Substring match, served by the idx_organizer_name_trgm trigram index
     stmt = select(models.Organizer).limit(limit)
+    if search:
+        stmt = stmt.where(models.Organizer.name.icontains(search, autoescape=True))
     result = await session.execute(stmt)
     return result.scalars().all()
 
@@ -143,47 +405,232 @@ async def get_organizers(
 @router.get("/venues", response_model=List[schemas.VenueSchema], summary="List Venues")
 async def get_venues(
     limit: int = 100, 
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     stmt = select(models.Venue).limit(limit)
     res = await session.execute(stmt)
     return res.scalars().all()
 
 
+@router.get("/cache", summary="Cache Statistics")
+async def get_cache_stats():
+    """
+    Size, hit rate and invalidation counters of the response caches and the
+    organizer/venue/tag id caches, how many reads were coalesced, and the state of the
+    listener for invalidations from other processes.
+    """
+    return {
+        "responses": response_cache.cache_stats(),
+        "invalidation": response_cache.listener.stats(),
+        "dimensions": dimensions.cache_stats(),
+        "coalescing": singleflight.flight_stats(),
+    }
+
+
 @router.get("/{slug}", response_model=schemas.EventResponse, summary="Get Event by Slug")
 async def get_event_by_slug(
     slug: str,
-    session: AsyncSession = Depends(get_async_session)
+    request: Request,
 ):
     """
     Get a single event by its slug with all details.
+    The document is built by Postgres in a single statement and returned as is.
+    It is cached until the event changes; `If-None-Match` with its `ETag` gives `304`.
+    Concurrent misses for the same slug share a single load.
+    A slug that was merged into another event (`dedupe`) redirects to that event.
     """
-    event = await event_service.get_event_by_slug(session, slug)
-    if not event:
+    cache = response_cache.event_cache
+    entry = cache.get(slug)
+    if entry is None:
+        entry = await singleflight.event_flight.do((slug, cache.generation), lambda: _load_event(slug))
+        if entry is None:
+            async with read_session() as session:
+                canonical = await dedup.canonical_slug(session, slug)
+            if canonical is None:
+                raise HTTPException(status_code=404, detail="Event not found")
+            return RedirectResponse(f"{router.prefix}/{canonical}", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    return _cached_response(request, cache, entry)
+
+
+async def _load_event(slug: str) -> Optional[response_cache.CachedResponse]:
+    # Shared by every coalesced request, so it owns its session
+    cache = response_cache.event_cache
+    generation = cache.generation
+    async with read_session() as session:
+        cacheable = _cacheable(session, cache)
+        found = await materialize.get_event_json_versioned(session, slug)
+    if found is None:
+        return None
+    body, event_id, version = found
+    entry = response_cache.CachedResponse(body, response_cache.event_etag(event_id, version))
+    if cacheable:
+        cache.put(slug, entry, generation)
+    return entry
+
+@router.get("/{slug}/similar", response_model=List[schemas.SimilarEvent], summary="Similar Events")
+async def get_similar_events(
+    slug: str,
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    "You may also like": the precomputed nearest events by embedding similarity,
+    shared tags and city, best first. Updated in the background after writes.
+    """
+    similar = await similar_service.get_similar(session, slug)
+    if similar is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    return event
+    return [{"score": value, "event": event} for value, event in similar]
 
 @router.post("/batch", status_code=status.HTTP_201_CREATED, summary="Batch Upsert Events")
 async def batch_upsert_events(
     events: List[schemas.EventCreate],
+    background_tasks: BackgroundTasks,
+    skip_unchanged: bool = False,
+    dedupe: bool = False,
+    session: AsyncSession = Depends(get_ingest_session)
+):
+    """
+    Batch upsert events. Produces the same result as calling the single create/update
+    for every event, but resolves organizers, venues and tags for the whole batch at once
+    and writes events and their children with multi-row statements.
+
+    With `skip_unchanged=true`, events whose content hash matches the stored one are
+    acknowledged as skipped without being loaded or written.
+
+    With `dedupe=true`, new slugs that duplicate an event from another source (same
+    venue, start within the hour, similar title) are merged into it as extra sources
+    instead of being created; `merged` lists these decisions.
+
+    Events the database rejects are left out and listed in `failed` (`slug`, `error`,
+    SQLSTATE `code`); the rest of the batch is stored. Resend only the failed ones.
+    `processed` and `slugs` count the stored events only.
+    """
+    result = await bulk_service.bulk_upsert_isolated(
+        session, events, skip_unchanged=skip_unchanged, dedupe=dedupe
+    )
+    await session.commit()
+    background_tasks.add_task(
+        similar_service.refresh_neighbors, ingest_session_factory, result.created + result.updated
+    )
+
+    failed = {failure["slug"] for failure in result.failed}
+    processed_slugs = [event_data.slug for event_data in events if event_data.slug not in failed]
+    changes = {
+        slug: {relation: asdict(counts) for relation, counts in relations.items() if counts}
+        for slug, relations in result.changes.items()
+    }
+    return {
+        "status": "partial" if result.failed else "success",
+        "processed": len(processed_slugs),
+        "slugs": processed_slugs,
+        "created": result.created,
+        "updated": result.updated,
+        "skipped": result.skipped,
+        "merged": [decision.report() for decision in result.merged],
+        "failed": result.failed,
+        "changes": changes,
+    }
+
+@router.post("/jobs", response_model=schemas.IngestJobReport, status_code=status.HTTP_202_ACCEPTED,
+             summary="Queue a Batch Ingest Job")
+async def create_ingest_job(
+    events: List[schemas.EventCreate],
+    response: Response,
+    skip_unchanged: bool = False,
+    dedupe: bool = False,
     session: AsyncSession = Depends(get_async_session)
 ):
     """
-    Batch upsert events. Uses the same logic as single create/update.
+    Validate a batch and queue it; returns `202` with the job right away. Workers write
+    it in chunks in the background, with the same semantics as `POST /events/batch`.
+    Repeated slugs are coalesced (the last payload wins). Poll `GET /events/jobs/{id}`
+    (the `Location` header) for progress and per-event errors.
     """
-    processed_slugs = []
-    
-    for event_data in events:
-        try:
-            await event_service.create_or_update_event(session, event_data)
-            processed_slugs.append(event_data.slug)
-        except Exception as e:
-            print(f"Error processing event {event_data.slug}: {e}")
-            raise e 
+    job = await jobs_service.enqueue(session, events, skip_unchanged=skip_unchanged, dedupe=dedupe)
+    await session.commit()
+    jobs_service.pool.wake()
+    response.headers["Location"] = f"{router.prefix}/jobs/{job.id}"
+    return jobs_service.report(job)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJobReport, summary="Batch Ingest Job Progress")
+async def get_ingest_job(
+    job_id: int,
+    session: AsyncSession = Depends(get_async_session)
+):
+    job = await jobs_service.get_job(session, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs_service.report(job)
+
+
+@router.post("/ingest", summary="Streaming NDJSON Ingest",
+             response_class=DuplexStreamingResponse,
+             openapi_extra={"requestBody": {"content": {"application/x-ndjson": {"schema": {"type": "string"}}}}},
+             responses={200: {"content": {"application/x-ndjson": {}}}})
+async def ingest_events(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    chunk_size: int = Query(ingest_service.DEFAULT_CHUNK_SIZE, ge=1, le=5000),
+    skip_unchanged: bool = False,
+    dedupe: bool = False,
+):
+    """
+    Upsert events sent as NDJSON (one EventCreate object per line). Lines are parsed and
+    validated as they arrive and committed every `chunk_size` events, so dumps of any
+    size are ingested with bounded memory. The response streams one NDJSON result per
+    input line: `{"line", "slug", "status": "ok", "action"}` or `{"line", "status": "error", "error"}`.
+    With `dedupe=true`, duplicates of events from other sources are merged like in `/batch` (action `merged`).
+    """
+    changed = []
+
+    async def results():
+        async for result in ingest_service.ingest_ndjson(
+            ingest_session_factory, request.stream(),
+            chunk_size=chunk_size, skip_unchanged=skip_unchanged, dedupe=dedupe,
+        ):
+            if result.get("action") in ("created", "updated"):
+                changed.append(result["slug"])
+            yield json.dumps(result, ensure_ascii=False) + "\n"
 
+    # runs once the last result line is sent, with the slugs collected while streaming
+    background_tasks.add_task(similar_service.refresh_neighbors, ingest_session_factory, changed)
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.post("/embeddings", status_code=status.HTTP_201_CREATED, summary="Bulk Embedding Upload",
+             openapi_extra={"requestBody": {"content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}})
+async def upload_embeddings(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    model_name: str = Query(..., max_length=50),
+    dim: int = Query(embedding_service.DIMENSIONS),
+    session: AsyncSession = Depends(get_ingest_session)
+):
+    """
+    Store embeddings for many events at once, replacing each event's previous vector
+    for `model_name`. The body is the event slugs, one per line, then an empty line,
+    then the matrix: row i belongs to slug i, as packed little-endian float32
+    (`n x dim` values) or a NumPy `.npy` file of shape `(n, dim)`.
+    """
+    body = await request.body()
+    try:
+        slugs, matrix = embedding_service.split_upload(body)
+        values = embedding_service.parse_matrix(matrix, len(slugs), dim)
+    except (ValueError, UnicodeDecodeError, SyntaxError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await embedding_service.replace_embeddings(session, slugs, values, model_name, dim)
     await session.commit()
-    
-    return {"status": "success", "processed": len(processed_slugs), "slugs": processed_slugs}
+    background_tasks.add_task(
+        similar_service.refresh_neighbors, ingest_session_factory, set(slugs) - set(result.missing), model_name
+    )
+    return {
+        "status": "success",
+        "model_name": model_name,
+        "stored": result.stored,
+        "replaced": result.replaced,
+        "missing": result.missing,
+    }
 
 @router.delete("/cleanup", status_code=204, summary="Delete ALL Events")
 async def cleanup_database(session: AsyncSession = Depends(get_async_session)):
@@ -192,5 +639,6 @@ async def cleanup_database(session: AsyncSession = Depends(get_async_session)):
     """
     stmt = delete(models.Event)
     await session.execute(stmt)
+    response_cache.mark_all_changed(session)
     await session.commit()
     return None
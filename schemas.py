@@ -1,6 +1,6 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from enum import Enum
 
 # Enums
@@ -11,6 +11,10 @@ class EventStatus(str, Enum):
     postponed = "postponed"
     done = "done"
 
+class EventOrder(str, Enum):
+    id = "id"                  # newest first
+    start_time = "start_time"  # next upcoming occurrence first
+
 # Nested Models
 class OrganizerSchema(BaseModel):
     name: str
@@ -110,3 +114,110 @@ class EventResponse(EventBase):
     images: List[EventImageSchema] = []
     
     model_config = ConfigDict(from_attributes=True)
+
+class EventSummary(BaseModel):
+    """
+    Lean list item: `id` plus whatever was requested via `fields=` / `include=`.
+    Unrequested keys are left out of the response entirely.
+    """
+    id: int
+    title: Optional[str] = None
+    slug: Optional[str] = None
+    description: Optional[str] = None
+    full_text: Optional[str] = None
+    language: Optional[str] = None
+    age_restriction: Optional[int] = None
+    status: Optional[EventStatus] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    next_occurrence: Optional[EventOccurrenceSchema] = None
+    primary_image: Optional[EventImageSchema] = None
+
+    organizer: Optional[OrganizerSchema] = None
+    default_venue: Optional[VenueSchema] = None
+    tags: Optional[List[TagSchema]] = None
+    occurrences: Optional[List[EventOccurrenceSchema]] = None
+    tickets: Optional[List[TicketTypeSchema]] = None
+    images: Optional[List[EventImageSchema]] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Timeline (occurrence-centric listing)
+
+class TimelineEventSchema(BaseModel):
+    id: int
+    title: str
+    slug: str
+    description: Optional[str] = None
+    age_restriction: int = 0
+    status: EventStatus
+
+    model_config = ConfigDict(from_attributes=True)
+
+class TimelineItem(BaseModel):
+    """One occurrence with a summary of its event. `venue` is the occurrence override or the event default."""
+    occurrence_id: int
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    tz: str = 'Europe/Moscow'
+    status: str = 'scheduled'
+    location_name: Optional[str] = None
+    venue: Optional[VenueSchema] = None
+    event: TimelineEventSchema
+
+class NearbyItem(TimelineItem):
+    """Timeline item with the great-circle distance from the query point to its venue."""
+    distance_km: float
+
+# Vector similarity search
+
+class VectorSearchRequest(BaseModel):
+    """Query vector plus the usual event filters. `ef_search` (HNSW) / `probes` (IVFFlat) trade latency for recall."""
+    vector: List[float]
+    model_name: str
+    k: int = Field(10, ge=1, le=100)
+    status: Optional[EventStatus] = None
+    tag_slug: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)
+    probes: Optional[int] = Field(None, ge=1, le=10000)
+
+class VectorSearchHit(BaseModel):
+    distance: float  # cosine distance, 0 = same direction
+    event: EventResponse
+
+class SimilarEvent(BaseModel):
+    score: float  # blend of embedding similarity, shared tags and same city; higher is closer
+    event: TimelineEventSchema
+
+class EventSearchHit(BaseModel):
+    rank: float  # ts_rank_cd, higher is better; title matches weigh most
+    event: TimelineEventSchema
+
+# Asynchronous ingest jobs
+
+class IngestJobError(BaseModel):
+    slug: Optional[str] = None  # None: the job as a whole failed
+    error: str
+    code: Optional[str] = None  # SQLSTATE
+
+class IngestJobReport(BaseModel):
+    """Progress of a batch ingest job. Counters cover the `processed` part of `total`."""
+    id: int
+    status: str  # queued, running, done, failed
+    total: int
+    processed: int
+    coalesced: int  # repeated slugs dropped when queued
+    created: int
+    updated: int
+    skipped: int
+    merged: int
+    superseded: int  # left to a newer job carrying the same slug
+    failed: int
+    errors: List[IngestJobError] = []
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,295 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, literal_column, select, tuple_, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+import schemas
+from services import dedup, dimensions, response_cache
+from services.dedup import MergeDecision
+from services.sql import chunks
+from services.reconcile import (
+    CHILD_FIELDS, CHILD_MODELS, ChildChanges, content_hash, diff_children, incoming_children, payload_venues,
+)
+
+
+
+@dataclass
+class BulkUpsertResult:
+    event_ids: Dict[str, int] = field(default_factory=dict)
+    created: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    changes: Dict[str, Dict[str, ChildChanges]] = field(default_factory=dict)
+    merged: List[MergeDecision] = field(default_factory=list)
+    failed: List[Dict[str, Optional[str]]] = field(default_factory=list)  # {"slug", "error", "code"}
+
+    def extend(self, other: "BulkUpsertResult") -> None:
+        self.event_ids.update(other.event_ids)
+        self.created += other.created
+        self.updated += other.updated
+        self.skipped += other.skipped
+        self.changes.update(other.changes)
+        self.merged += other.merged
+        self.failed += other.failed
+
+
+def describe_error(error: Exception) -> Dict[str, Optional[str]]:
+    """The database's message and SQLSTATE, without the statement SQLAlchemy appends."""
+    orig = getattr(error, "orig", None)
+    return {"error": str(orig or error).splitlines()[0], "code": getattr(orig, "sqlstate", None)}
+
+
+def _dedupe_by_slug(events: List[schemas.EventCreate]) -> List[schemas.EventCreate]:
+    # Last payload wins, like sequential create_or_update_event calls would
+    latest: Dict[str, schemas.EventCreate] = {}
+    for event_data in events:
+        latest.pop(event_data.slug, None)
+        latest[event_data.slug] = event_data
+    return list(latest.values())
+
+
+async def stored_hashes(session: AsyncSession, slugs: List[str]) -> Dict[str, str]:
+    hashes = {}
+    for chunk in chunks(slugs):
+        stmt = select(models.Event.slug, models.Event.content_hash).where(models.Event.slug.in_(chunk))
+        hashes.update({slug: digest for slug, digest in (await session.execute(stmt)).all()})
+    return hashes
+
+
+async def bulk_upsert_events(
+    session: AsyncSession,
+    events: List[schemas.EventCreate],
+    skip_unchanged: bool = False,
+    dedupe: bool = False,
+) -> BulkUpsertResult:
+    """
+    Set-based equivalent of calling create_or_update_event for every event:
+    dimensions are resolved for the whole batch at once, events are upserted with
+    INSERT ... ON CONFLICT (slug) and children are reconciled with multi-row statements.
+
+    With `skip_unchanged`, events whose stored content hash matches the payload are
+    reported as skipped without any further reads or writes.
+
+    With `dedupe`, new slugs that duplicate an existing event (or an earlier payload of
+    the batch) from another source are not created: their sources are merged into
+    that canonical event and the decisions are reported in `merged`.
+    """
+    result = BulkUpsertResult()
+    events = _dedupe_by_slug(events)
+    hashes = {event_data.slug: content_hash(event_data) for event_data in events}
+
+    stored = {}
+    if (skip_unchanged or dedupe) and events:
+        stored = await stored_hashes(session, list(hashes))
+
+    if skip_unchanged and events:
+        result.skipped = [slug for slug, digest in hashes.items() if stored.get(slug) == digest]
+        unchanged = set(result.skipped)
+        events = [event_data for event_data in events if event_data.slug not in unchanged]
+
+    merging = {}
+    if dedupe and events:
+        decisions = await dedup.find_duplicates(session, events, set(stored))
+        merging = {e.slug: e for e in events if e.slug in decisions}
+        result.merged = list(decisions.values())
+        events = [event_data for event_data in events if event_data.slug not in decisions]
+
+    if events:
+        await _upsert_events(session, events, hashes, result)
+    if merging:
+        for decision in result.merged:
+            if decision.canonical_id is None:
+                decision.canonical_id = result.event_ids[decision.canonical]
+        merged_changes = await dedup.merge_sources(session, merging, {d.slug: d for d in result.merged})
+        result.changes.update({slug: {"sources": changes} for slug, changes in merged_changes.items()})
+    return result
+
+
+async def bulk_upsert_isolated(
+    session: AsyncSession,
+    events: List[schemas.EventCreate],
+    skip_unchanged: bool = False,
+    dedupe: bool = False,
+) -> BulkUpsertResult:
+    """
+    bulk_upsert_events where one bad event cannot fail the batch. The batch is written
+    in a SAVEPOINT; when the database rejects it, each half is retried in a savepoint of
+    its own, down to single events. Events that fail on their own are reported in
+    `failed`, everything else stays in the transaction. A clean batch costs a single
+    savepoint, f bad events about 2·f·log2(n) more. Lost connections still raise.
+    """
+    result = BulkUpsertResult()
+    await _write_isolated(session, _dedupe_by_slug(events), skip_unchanged, dedupe, result)
+    return result
+
+
+async def _write_isolated(
+    session: AsyncSession,
+    events: List[schemas.EventCreate],
+    skip_unchanged: bool,
+    dedupe: bool,
+    result: BulkUpsertResult,
+) -> None:
+    if not events:
+        return
+    try:
+        async with session.begin_nested():
+            part = await bulk_upsert_events(session, events, skip_unchanged=skip_unchanged, dedupe=dedupe)
+    except DBAPIError as e:
+        if e.connection_invalidated:
+            raise
+        if len(events) == 1:
+            result.failed.append({"slug": events[0].slug, **describe_error(e)})
+            return
+        middle = len(events) // 2
+        await _write_isolated(session, events[:middle], skip_unchanged, dedupe, result)
+        await _write_isolated(session, events[middle:], skip_unchanged, dedupe, result)
+        return
+    result.extend(part)
+
+
+async def _upsert_events(
+    session: AsyncSession, events: List[schemas.EventCreate], hashes: Dict[str, str], result: BulkUpsertResult
+) -> None:
+    """Write `events` and their children, filling event_ids, created, updated and changes of `result`."""
+    # 1. Dimensions
+    organizers, venues, tags = {}, {}, {}
+    for event_data in events:
+        if event_data.organizer:
+            organizers.setdefault(event_data.organizer.name, event_data.organizer)
+        for key, venue in payload_venues(event_data).items():
+            venues.setdefault(key, venue)
+        for tag in event_data.tags:
+            tags.setdefault(tag.slug, tag)
+    organizer_ids = await dimensions.resolve_organizer_ids(session, organizers)
+    venue_ids = await dimensions.resolve_venue_ids(session, venues)
+    tag_ids = await dimensions.resolve_tag_ids(session, tags)
+
+    # 2. Events
+    rows = []
+    for event_data in events:
+        venue = event_data.default_venue
+        rows.append({
+            "title": event_data.title,
+            "slug": event_data.slug,
+            "description": event_data.description,
+            "full_text": event_data.full_text,
+            "language": event_data.language,
+            "age_restriction": event_data.age_restriction,
+            "status": event_data.status,
+            "organizer_id": organizer_ids.get(event_data.organizer.name) if event_data.organizer else None,
+            "venue_id": venue_ids.get((venue.name, venue.city)) if venue else None,
+            "content_hash": hashes[event_data.slug],
+        })
+
+    for chunk in chunks(rows, len(rows[0])):
+        stmt = insert(models.Event).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.Event.slug],
+            set_={
+                "title": stmt.excluded.title,
+                "description": stmt.excluded.description,
+                "full_text": stmt.excluded.full_text,
+                "language": stmt.excluded.language,
+                "age_restriction": stmt.excluded.age_restriction,
+                "status": stmt.excluded.status,
+                # Keep the current organizer/venue when the payload has none
+                "organizer_id": func.coalesce(stmt.excluded.organizer_id, models.Event.organizer_id),
+                "venue_id": func.coalesce(stmt.excluded.venue_id, models.Event.venue_id),
+                "updated_at": func.now(),
+                "content_hash": stmt.excluded.content_hash,
+            },
+        ).returning(models.Event.id, models.Event.slug, literal_column("xmax = 0"))
+        for event_id, slug, inserted in (await session.execute(stmt)).all():
+            result.event_ids[slug] = event_id
+            (result.created if inserted else result.updated).append(slug)
+    response_cache.mark_changed(session, result.event_ids)
+
+    # 3. Children: diff against what is stored for updated events
+    existing_ids = [result.event_ids[slug] for slug in result.updated]
+    result.changes = await reconcile_children(session, events, result.event_ids, tag_ids, venue_ids, existing_ids)
+
+
+async def reconcile_children(
+    session: AsyncSession,
+    events: List[schemas.EventCreate],
+    event_ids: Dict[str, int],
+    tag_ids: Dict[str, int],
+    venue_ids: Dict[Tuple[str, str], int],
+    existing_ids: List[int],
+) -> Dict[str, Dict[str, ChildChanges]]:
+    """
+    Bring child rows in line with the payloads, touching only rows that differ.
+    Stored children are loaded per table, in bind-parameter-sized chunks, and only
+    for `existing_ids` (events that were updated rather than created).
+    """
+    changes: Dict[str, Dict[str, ChildChanges]] = {e.slug: {} for e in events}
+
+    # Tags
+    current_links: Dict[int, set] = {}
+    for chunk in chunks(existing_ids):
+        stmt = select(models.EventTag.event_id, models.EventTag.tag_id).where(models.EventTag.event_id.in_(chunk))
+        for event_id, tag_id in (await session.execute(stmt)).all():
+            current_links.setdefault(event_id, set()).add(tag_id)
+
+    stale_links, new_links = [], []
+    for event_data in events:
+        event_id = event_ids[event_data.slug]
+        current = current_links.get(event_id, set())
+        wanted = set(tag_ids[t.slug] for t in event_data.tags)
+        stale_links.extend((event_id, tag_id) for tag_id in current - wanted)
+        new_links.extend({"event_id": event_id, "tag_id": tag_id} for tag_id in wanted - current)
+        changes[event_data.slug]["tags"] = ChildChanges(
+            inserted=len(wanted - current), deleted=len(current - wanted)
+        )
+    for chunk in chunks(stale_links, 2):
+        await session.execute(
+            delete(models.EventTag).where(tuple_(models.EventTag.event_id, models.EventTag.tag_id).in_(chunk))
+        )
+    await insert_rows(session, models.EventTag, new_links)
+
+    # Occurrences, tickets, images, sources
+    for relation, model in CHILD_MODELS.items():
+        key_field, fields = CHILD_FIELDS[relation]
+        stored: Dict[int, list] = {}
+        columns = [model.id, model.event_id, getattr(model, key_field)] + [getattr(model, f) for f in fields]
+        for chunk in chunks(existing_ids):
+            stmt = select(*columns).where(model.event_id.in_(chunk))
+            if model is models.EventSource:
+                # Sources merged in from duplicates belong to those payloads (services/dedup.py)
+                stmt = stmt.where(model.merged_from.is_(None))
+            for row in (await session.execute(stmt)).all():
+                stored.setdefault(row.event_id, []).append(row)
+
+        to_delete, to_update, to_insert = [], [], []
+        for event_data in events:
+            event_id = event_ids[event_data.slug]
+            incoming = incoming_children(event_data, relation, venue_ids)
+            diff = diff_children(relation, stored.get(event_id, []), incoming)
+            to_delete.extend(row.id for row in diff.to_delete)
+            to_update.extend(
+                {"id": row.id, **{f: values.get(f, getattr(row, f)) for f in fields}}
+                for row, values in diff.to_update
+            )
+            to_insert.extend({"event_id": event_id, **values} for values in diff.to_insert)
+            changes[event_data.slug][relation] = diff.changes
+
+        # Deletes go first so a freed natural key can be reused by an insert
+        for chunk in chunks(to_delete):
+            await session.execute(delete(model).where(model.id.in_(chunk)))
+        if to_update:
+            await session.execute(update(model), to_update)
+        await insert_rows(session, model, to_insert)
+
+    return changes
+
+
+async def insert_rows(session: AsyncSession, model: Any, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    for chunk in chunks(rows, len(rows[0])):
+        await session.execute(insert(model).values(chunk))
@@ -0,0 +1,44 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Sequence
+
+
+def encode_cursor(kind: str, key: List[Any]) -> str:
+    """Opaque keyset cursor: the sort key of the last row of a page."""
+    if not key:
+        raise ValueError("cursor key is empty")
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    raw = json.dumps({"o": kind, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, kind: str, types: Sequence[type]) -> List[Any]:
+    """
+    Return the sort key stored in `token`, one value per entry of `types` (datetime,
+    int or float) converted to that type. Raises ValueError for foreign or broken cursors.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        if data["o"] != kind:
+            raise ValueError(f"cursor was issued for '{data['o']}' ordering")
+        values = data["k"]
+    except (KeyError, TypeError, json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("invalid cursor: wrong key length")
+    return [_convert(value, expected) for value, expected in zip(values, types)]
+
+
+def _convert(value: Any, expected: type) -> Any:
+    if expected is datetime and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError as e:
+            raise ValueError(f"invalid cursor: {e}") from e
+    if expected is float and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if expected is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"invalid cursor: expected {expected.__name__}, got {type(value).__name__}")
@@ -0,0 +1,276 @@
+"""
+Cross-source duplicate detection for batch ingest.
+
+The same event scraped from several sites arrives under different slugs. A new slug
+is matched against events in the same blocking bucket (venue city + start hour,
+probed with a +-DEDUP_WINDOW_HOURS window). A candidate must be at the same venue
+(same normalized name, or both located within DEDUP_VENUE_METERS) and have a title
+whose character trigrams reach DEDUP_TITLE_THRESHOLD Jaccard similarity; a city
+alone holds too many unrelated shows with generic titles ("Концерт: джаз вечер").
+A bucket holds a handful of events, so a match costs microseconds. A matched payload
+does not become an event: its sources are stored on the canonical event with
+`merged_from` set to its slug, which also short-circuits its next sync.
+"""
+import math
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, FrozenSet, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from db import models
+import schemas
+from services.reconcile import CHILD_FIELDS, ChildChanges, diff_children, incoming_children, normalize
+from services.sql import chunks
+
+TITLE_THRESHOLD = float(os.getenv("DEDUP_TITLE_THRESHOLD", "0.7"))
+WINDOW_HOURS = int(os.getenv("DEDUP_WINDOW_HOURS", "1"))
+VENUE_METERS = float(os.getenv("DEDUP_VENUE_METERS", "200"))
+
+
+BlockKey = Tuple[str, int]  # (city, hours since epoch)
+
+
+class VenueKey(NamedTuple):
+    name: str  # normalized
+    lat: Optional[float]
+    lon: Optional[float]
+
+
+def venue_key(name: str, lat: Optional[float], lon: Optional[float]) -> VenueKey:
+    return VenueKey(normalize_title(name or ""), lat, lon)
+
+
+def same_venue(a: VenueKey, b: VenueKey) -> bool:
+    if a.name and a.name == b.name:
+        return True
+    if None in (a.lat, a.lon, b.lat, b.lon):
+        return False
+    # equirectangular distance, exact enough at a few hundred meters
+    dx = math.radians(b.lon - a.lon) * math.cos(math.radians((a.lat + b.lat) / 2))
+    dy = math.radians(b.lat - a.lat)
+    return 6_371_000 * math.hypot(dx, dy) <= VENUE_METERS
+
+
+@dataclass
+class MergeDecision:
+    slug: str
+    canonical: str
+    score: float
+    method: str  # "title": matched now, "source": merged before (known merged_from slug)
+    canonical_id: Optional[int] = None
+
+    def report(self) -> Dict[str, object]:
+        return {"slug": self.slug, "canonical": self.canonical, "score": round(self.score, 3), "method": self.method}
+
+
+def normalize_title(title: str) -> str:
+    title = title.lower().replace("ё", "е")
+    return " ".join(re.sub(r"[^\w]+", " ", title).split())
+
+
+def title_shingles(title: str) -> FrozenSet[str]:
+    text = f" {normalize_title(title)} "
+    return frozenset(text[i:i + 3] for i in range(max(1, len(text) - 2)))
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def _bucket(start_time: datetime) -> int:
+    return int(normalize(start_time).timestamp() // 3600)
+
+
+def blocking_keys(event_data: schemas.EventCreate) -> Dict[BlockKey, Set[VenueKey]]:
+    """
+    (city, start hour) of every occurrence, with the venues seen there; the occurrence
+    venue wins over the default one.
+    """
+    keys: Dict[BlockKey, Set[VenueKey]] = defaultdict(set)
+    for occurrence in event_data.occurrences:
+        venue = occurrence.venue or event_data.default_venue
+        if venue and venue.city:
+            key = (venue.city.strip().lower(), _bucket(occurrence.start_time))
+            keys[key].add(venue_key(venue.name, venue.lat, venue.lon))
+    return dict(keys)
+
+
+class BlockIndex:
+    """In-memory blocking index: bucket -> events (reference -> title shingles, venues)."""
+
+    def __init__(self):
+        self._blocks: Dict[BlockKey, Dict[Hashable, Tuple[FrozenSet[str], Set[VenueKey]]]] = defaultdict(dict)
+
+    def add(self, ref: Hashable, keys: Dict[BlockKey, Set[VenueKey]], shingles: FrozenSet[str]) -> None:
+        for key, venues in keys.items():
+            _, known = self._blocks[key].setdefault(ref, (shingles, set()))
+            known.update(venues)
+
+    def best_match(
+        self, keys: Dict[BlockKey, Set[VenueKey]], shingles: FrozenSet[str]
+    ) -> Optional[Tuple[Hashable, float]]:
+        best, best_score = None, TITLE_THRESHOLD
+        for (city, hour), venues in keys.items():
+            for probe in range(hour - WINDOW_HOURS, hour + WINDOW_HOURS + 1):
+                for ref, (other, other_venues) in self._blocks.get((city, probe), {}).items():
+                    score = similarity(shingles, other)
+                    if score >= best_score and any(same_venue(a, b) for a in venues for b in other_venues):
+                        best, best_score = ref, score
+        return (best, best_score) if best is not None else None
+
+
+async def _merged_before(session: AsyncSession, slugs: List[str]) -> Dict[str, Tuple[int, str]]:
+    """slug -> (canonical id, canonical slug) for slugs already merged into an event."""
+    found = {}
+    for chunk in chunks(slugs):
+        stmt = (
+            select(models.EventSource.merged_from, models.Event.id, models.Event.slug)
+            .join(models.Event, models.Event.id == models.EventSource.event_id)
+            .where(models.EventSource.merged_from.in_(chunk))
+        )
+        found.update({slug: (event_id, canonical) for slug, event_id, canonical in (await session.execute(stmt)).all()})
+    return found
+
+
+def _windows(keys: Iterable[BlockKey]) -> List[Tuple[datetime, datetime]]:
+    """Disjoint start_time ranges covering every probed bucket."""
+    hours = sorted({hour for _, hour in keys})
+    windows: List[List[int]] = []
+    for hour in hours:
+        lo, hi = hour - WINDOW_HOURS, hour + WINDOW_HOURS + 1
+        if windows and lo <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], hi)
+        else:
+            windows.append([lo, hi])
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return [(epoch + timedelta(hours=lo), epoch + timedelta(hours=hi)) for lo, hi in windows]
+
+
+async def _stored_candidates(session: AsyncSession, keys: Set[BlockKey]) -> BlockIndex:
+    """Events with an occurrence in any probed bucket, indexed by (event id, slug)."""
+    index = BlockIndex()
+    if not keys:
+        return index
+    occ = models.EventOccurrence
+    own_venue = aliased(models.Venue)
+    default_venue = aliased(models.Venue)
+    city = func.lower(func.trim(func.coalesce(own_venue.city, default_venue.city)))
+    located = occ.venue_id.is_not(None)
+    venue_columns = (
+        case((located, own_venue.name), else_=default_venue.name),
+        case((located, own_venue.lat), else_=default_venue.lat),
+        case((located, own_venue.lon), else_=default_venue.lon),
+    )
+    cities = sorted({c for c, _ in keys})
+    windows = _windows(keys)
+    for chunk in chunks(windows, 4):
+        stmt = (
+            select(models.Event.id, models.Event.slug, models.Event.title, city, occ.start_time, *venue_columns)
+            .select_from(occ)
+            .join(models.Event, models.Event.id == occ.event_id)
+            .outerjoin(own_venue, own_venue.id == occ.venue_id)
+            .outerjoin(default_venue, default_venue.id == models.Event.venue_id)
+            .where(or_(*(and_(occ.start_time >= lo, occ.start_time < hi) for lo, hi in chunk)))
+            .where(city.in_(cities))
+        )
+        shingles = {}
+        for event_id, slug, title, event_city, start_time, name, lat, lon in (await session.execute(stmt)).all():
+            if event_id not in shingles:
+                shingles[event_id] = title_shingles(title)
+            key = (event_city, _bucket(start_time))
+            index.add((event_id, slug), {key: {venue_key(name, lat, lon)}}, shingles[event_id])
+    return index
+
+
+async def find_duplicates(
+    session: AsyncSession, events: List[schemas.EventCreate], existing: Set[str]
+) -> Dict[str, MergeDecision]:
+    """
+    Merge decisions for the payloads in `events` that are duplicates. Slugs in `existing`
+    are events already and are never merged. A payload may also match one created
+    earlier in the same batch; its canonical_id is then None until that one is written.
+    """
+    new = [event_data for event_data in events if event_data.slug not in existing]
+    if not new:
+        return {}
+
+    decisions: Dict[str, MergeDecision] = {}
+    for slug, (event_id, canonical) in (await _merged_before(session, [e.slug for e in new])).items():
+        decisions[slug] = MergeDecision(slug, canonical, 1.0, "source", event_id)
+
+    keys = {event_data.slug: blocking_keys(event_data) for event_data in new if event_data.slug not in decisions}
+    index = await _stored_candidates(session, {key for event_keys in keys.values() for key in event_keys})
+    for event_data in new:
+        if event_data.slug in decisions or not keys[event_data.slug]:
+            continue
+        shingles = title_shingles(event_data.title)
+        match = index.best_match(keys[event_data.slug], shingles)
+        if match is None:
+            # Not a duplicate: later payloads of this batch may match it
+            index.add((None, event_data.slug), keys[event_data.slug], shingles)
+            continue
+        (event_id, canonical), score = match
+        decisions[event_data.slug] = MergeDecision(event_data.slug, canonical, score, "title", event_id)
+    return decisions
+
+
+async def merge_sources(
+    session: AsyncSession, events: Dict[str, schemas.EventCreate], decisions: Dict[str, MergeDecision]
+) -> Dict[str, ChildChanges]:
+    """
+    Store the sources of each merged payload on its canonical event, reconciled by
+    fingerprint against what that payload contributed before. Decisions need canonical_id.
+    """
+    model = models.EventSource
+    key_field, fields = CHILD_FIELDS["sources"]
+    slugs = list(decisions)
+    stored: Dict[str, list] = defaultdict(list)
+    columns = [model.id, model.merged_from, getattr(model, key_field)] + [getattr(model, f) for f in fields]
+    for chunk in chunks(slugs):
+        stmt = select(*columns).where(model.merged_from.in_(chunk))
+        for row in (await session.execute(stmt)).all():
+            stored[row.merged_from].append(row)
+
+    changes = {}
+    to_delete, to_update, to_insert = [], [], []
+    for slug, decision in decisions.items():
+        diff = diff_children("sources", stored[slug], incoming_children(events[slug], "sources"))
+        to_delete.extend(row.id for row in diff.to_delete)
+        to_update.extend(
+            {"id": row.id, "event_id": decision.canonical_id, **{f: values.get(f, getattr(row, f)) for f in fields}}
+            for row, values in diff.to_update
+        )
+        to_insert.extend(
+            {"event_id": decision.canonical_id, "merged_from": slug, **values} for values in diff.to_insert
+        )
+        changes[slug] = diff.changes
+
+    for chunk in chunks(to_delete):
+        await session.execute(delete(model).where(model.id.in_(chunk)))
+    if to_update:
+        await session.execute(update(model), to_update)
+    width = len(fields) + 3
+    for chunk in chunks(to_insert, width):
+        await session.execute(insert(model).values(chunk))
+    return changes
+
+
+async def canonical_slug(session: AsyncSession, slug: str) -> Optional[str]:
+    """Slug of the event that `slug` was merged into, if it was."""
+    stmt = (
+        select(models.Event.slug)
+        .join(models.EventSource, models.EventSource.event_id == models.Event.id)
+        .where(models.EventSource.merged_from == slug)
+        .limit(1)
+    )
+    return (await session.execute(stmt)).scalar()
@@ -0,0 +1,295 @@
+"""
+Process-local cache of dimension ids (organizers, venues, tags).
+
+These tables are tiny and almost never change, so natural key -> id lookups are kept
+in bounded LRU caches. Ids of rows inserted by a transaction are kept in a per-session
+pending index and only promoted to the shared cache once that transaction commits,
+so a rollback can never leave a dangling id behind. Rolling back a savepoint drops the
+ids pending since it was opened; releasing one promotes nothing.
+"""
+import os
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import models
+import schemas
+from services.sql import chunks
+
+PENDING_KEY = "dimension_pending"
+SAVEPOINTS_KEY = "dimension_savepoints"
+
+
+class DimensionCache:
+    def __init__(self, name: str, maxsize: int = 10000):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: int) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+CACHE_SIZE = int(os.getenv("DIMENSION_CACHE_SIZE", "10000"))
+
+organizer_cache = DimensionCache("organizers", CACHE_SIZE)
+venue_cache = DimensionCache("venues", CACHE_SIZE)
+# Tags are unique by slug and by name, both are cached: ("slug", s) / ("name", n)
+tag_cache = DimensionCache("tags", CACHE_SIZE)
+
+CACHES = {cache.name: cache for cache in (organizer_cache, venue_cache, tag_cache)}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+# --- Pending index (per transaction) ---
+
+def _pending(session: AsyncSession, cache: DimensionCache) -> Dict[Hashable, int]:
+    return session.info.setdefault(PENDING_KEY, {}).setdefault(cache.name, {})
+
+
+def _lookup(session: AsyncSession, cache: DimensionCache, keys: Iterable[Hashable]) -> Dict[Hashable, int]:
+    pending = _pending(session, cache)
+    found = {}
+    for key in keys:
+        value = pending.get(key)
+        if value is None:
+            value = cache.get(key)
+        if value is not None:
+            found[key] = value
+    return found
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session: Session) -> None:
+    if session.in_nested_transaction():  # savepoint released, the transaction goes on
+        return
+    session.info.pop(SAVEPOINTS_KEY, None)
+    for name, entries in session.info.pop(PENDING_KEY, {}).items():
+        for key, value in entries.items():
+            CACHES[name].put(key, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    if session.in_nested_transaction():  # handled by _rewind_pending
+        return
+    session.info.pop(SAVEPOINTS_KEY, None)
+    session.info.pop(PENDING_KEY, None)
+
+
+# Pending entries are only ever added, so a savepoint just remembers how many there were
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction) -> None:
+    if transaction.nested:
+        sizes = {name: len(entries) for name, entries in session.info.get(PENDING_KEY, {}).items()}
+        session.info.setdefault(SAVEPOINTS_KEY, {})[transaction] = sizes
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _rewind_pending(session: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        return
+    sizes = session.info.get(SAVEPOINTS_KEY, {}).pop(previous_transaction, None)
+    if sizes is None:
+        return
+    pending = session.info.get(PENDING_KEY, {})
+    for name, entries in pending.items():
+        pending[name] = dict(islice(entries.items(), sizes.get(name, 0)))
+
+
+# --- Resolvers ---
+# Each resolver goes pending index -> shared cache -> one SELECT for the misses ->
+# one INSERT ... ON CONFLICT DO NOTHING for what is still missing -> re-SELECT for
+# rows another worker inserted in the meantime.
+
+async def resolve_organizer_ids(
+    session: AsyncSession, organizers: Dict[str, schemas.OrganizerSchema]
+) -> Dict[str, int]:
+    ids = _lookup(session, organizer_cache, organizers)
+    missing = [name for name in organizers if name not in ids]
+    if not missing:
+        return ids
+
+    async def select_ids(names: List[str]) -> Dict[str, int]:
+        found = {}
+        for chunk in chunks(names, 1):
+            stmt = (
+                select(models.Organizer.name, func.min(models.Organizer.id))
+                .where(models.Organizer.name.in_(chunk))
+                .group_by(models.Organizer.name)
+            )
+            found.update({name: id_ for name, id_ in (await session.execute(stmt)).all()})
+        return found
+
+    found = await select_ids(missing)
+    for name, id_ in found.items():
+        organizer_cache.put(name, id_)
+    ids.update(found)
+
+    rows = [
+        {"name": name, "rating": organizers[name].rating or 0.0, "social_links": organizers[name].social_links}
+        for name in missing if name not in found
+    ]
+    if rows:
+        inserted = {}
+        for chunk in chunks(rows, 3):
+            stmt = (
+                insert(models.Organizer).values(chunk).on_conflict_do_nothing()
+                .returning(models.Organizer.id, models.Organizer.name)
+            )
+            inserted.update({name: id_ for id_, name in (await session.execute(stmt)).all()})
+        lost = [row["name"] for row in rows if row["name"] not in inserted]
+        if lost:
+            inserted.update(await select_ids(lost))
+        _pending(session, organizer_cache).update(inserted)
+        ids.update(inserted)
+    return ids
+
+
+async def resolve_venue_ids(
+    session: AsyncSession, venues: Dict[Tuple[str, str], schemas.VenueSchema]
+) -> Dict[Tuple[str, str], int]:
+    ids = _lookup(session, venue_cache, venues)
+    missing = [key for key in venues if key not in ids]
+    if not missing:
+        return ids
+
+    async def select_ids(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        found = {}
+        for chunk in chunks(keys, 2):
+            stmt = (
+                select(models.Venue.name, models.Venue.city, func.min(models.Venue.id))
+                .where(tuple_(models.Venue.name, models.Venue.city).in_(chunk))
+                .group_by(models.Venue.name, models.Venue.city)
+            )
+            found.update({(name, city): id_ for name, city, id_ in (await session.execute(stmt)).all()})
+        return found
+
+    found = await select_ids(missing)
+    for key, id_ in found.items():
+        venue_cache.put(key, id_)
+    ids.update(found)
+
+    rows = [
+        {"name": v.name, "address": v.address, "city": v.city, "lat": v.lat, "lon": v.lon}
+        for v in (venues[key] for key in missing if key not in found)
+    ]
+    if rows:
+        inserted = {}
+        for chunk in chunks(rows, 5):
+            stmt = (
+                insert(models.Venue).values(chunk).on_conflict_do_nothing()
+                .returning(models.Venue.id, models.Venue.name, models.Venue.city)
+            )
+            inserted.update({(name, city): id_ for id_, name, city in (await session.execute(stmt)).all()})
+        lost = [(row["name"], row["city"]) for row in rows if (row["name"], row["city"]) not in inserted]
+        if lost:
+            inserted.update(await select_ids(lost))
+        _pending(session, venue_cache).update(inserted)
+        ids.update(inserted)
+    return ids
+
+
+async def resolve_tag_ids(session: AsyncSession, tags: Dict[str, schemas.TagSchema]) -> Dict[str, int]:
+    """
+    Map tag slugs to ids. An existing tag matching either the slug or the name is
+    reused, since both columns are unique.
+    """
+    def match(index: Dict[Hashable, int]) -> Dict[str, int]:
+        matched = {}
+        for slug, tag in tags.items():
+            id_ = index.get(("slug", slug)) or index.get(("name", tag.name))
+            if id_:
+                matched[slug] = id_
+        return matched
+
+    def merge(matched: Dict[str, int]) -> None:
+        for slug, id_ in matched.items():
+            ids.setdefault(slug, id_)
+
+    async def select_ids(wanted: Dict[str, schemas.TagSchema]) -> Dict[Hashable, int]:
+        index = {}
+        for chunk in chunks(list(wanted.items()), 2):
+            stmt = select(models.Tag.id, models.Tag.slug, models.Tag.name).where(
+                models.Tag.slug.in_([slug for slug, _ in chunk])
+                | models.Tag.name.in_([tag.name for _, tag in chunk])
+            )
+            for id_, slug, name in (await session.execute(stmt)).all():
+                index[("slug", slug)] = id_
+                index[("name", name)] = id_
+        return index
+
+    index = _lookup(session, tag_cache, [("slug", slug) for slug in tags])
+    index.update(_lookup(session, tag_cache, [("name", t.name) for slug, t in tags.items() if ("slug", slug) not in index]))
+    ids = match(index)
+    missing = {slug: tag for slug, tag in tags.items() if slug not in ids}
+    if not missing:
+        return ids
+
+    found = await select_ids(missing)
+    for key, id_ in found.items():
+        tag_cache.put(key, id_)
+    merge(match(found))
+
+    seen_names = set()
+    rows = []
+    for slug, tag in missing.items():
+        if slug in ids or tag.name in seen_names:
+            continue
+        seen_names.add(tag.name)
+        rows.append({"name": tag.name, "slug": slug})
+    if rows:
+        inserted = {}
+        for chunk in chunks(rows, 2):
+            stmt = (
+                insert(models.Tag).values(chunk).on_conflict_do_nothing()
+                .returning(models.Tag.id, models.Tag.slug, models.Tag.name)
+            )
+            for id_, slug, name in (await session.execute(stmt)).all():
+                inserted[("slug", slug)] = id_
+                inserted[("name", name)] = id_
+        _pending(session, tag_cache).update(inserted)
+        merge(match(inserted))
+
+        # Conflicts: a concurrent insert, or a slug/name clash inside the batch
+        lost = {slug: tag for slug, tag in missing.items() if slug not in ids}
+        if lost:
+            found = await select_ids(lost)
+            _pending(session, tag_cache).update(found)
+            merge(match(found))
+    return ids
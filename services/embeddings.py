@@ -0,0 +1,191 @@
+"""
+Bulk embedding upload.
+
+Vectors arrive as one packed float32 matrix (raw little-endian bytes or a NumPy .npy
+file) instead of JSON arrays. The matrix is viewed in place, checked as a whole and
+streamed to Postgres with binary COPY, so neither side ever formats or parses floats
+as text.
+"""
+import ast
+import re
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+from services.sql import chunks
+
+DIMENSIONS = models.EventEmbedding.embedding.type.dim
+NPY_MAGIC = b"\x93NUMPY"
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+COPY_ROWS_PER_CHUNK = 1000
+BLANK_LINE = re.compile(rb"\r?\n\r?\n")
+# A float32 is NaN or infinite when all 8 exponent bits are set: the low 7 bits of its
+# last little-endian byte and the top bit of the one before. Tables for bytes.translate.
+EXPONENT_HIGH = bytes(1 if b & 0x7F == 0x7F else 0 for b in range(256))
+EXPONENT_LOW = bytes(1 if b & 0x80 else 0 for b in range(256))
+
+
+@dataclass
+class EmbeddingUploadResult:
+    stored: int = 0
+    replaced: int = 0
+    missing: List[str] = field(default_factory=list)
+
+
+def split_upload(body: bytes) -> Tuple[List[str], memoryview]:
+    """
+    Split an upload into its slug list and matrix bytes. The body is the slugs, one per
+    line (LF or CRLF), then an empty line, then the matrix; the matrix is returned as a
+    view, not a copy.
+    """
+    blank = BLANK_LINE.search(body)
+    if blank is None:
+        raise ValueError("expected slugs, an empty line, then the matrix")
+    slugs = [line.strip() for line in body[:blank.start()].decode("utf-8").split("\n")]
+    if not all(slugs):
+        raise ValueError("blank slug in slug list")
+    return slugs, memoryview(body)[blank.end():]
+
+
+def _npy_payload(data: memoryview) -> Tuple[memoryview, Tuple[int, ...]]:
+    """Data bytes and shape of a .npy file. Raises ValueError for truncated or malformed headers."""
+    if len(data) < 10:
+        raise ValueError("truncated .npy header")
+    major = data[6]
+    if major == 1:
+        length_format, start = "<H", 10
+    elif major in (2, 3):
+        length_format, start = "<I", 12
+    else:
+        raise ValueError(f"unsupported .npy version {major}")
+    try:
+        (header_len,) = struct.unpack_from(length_format, data, 8)
+    except struct.error as e:
+        raise ValueError("truncated .npy header") from e
+    if len(data) < start + header_len:
+        raise ValueError("truncated .npy header")
+    try:
+        header = ast.literal_eval(bytes(data[start:start + header_len]).decode("latin1"))
+    except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError) as e:
+        raise ValueError(f"malformed .npy header: {e}") from e
+    if not isinstance(header, dict):
+        raise ValueError(".npy header is not a dictionary")
+    if header.get("descr") not in ("<f4", "|f4") or header.get("fortran_order"):
+        raise ValueError(f".npy must hold a C-order little-endian float32 array, got {header.get('descr')}")
+    shape = header.get("shape", ())
+    if not isinstance(shape, tuple):
+        raise ValueError(f"malformed .npy shape {shape!r}")
+    return data[start + header_len:], shape
+
+
+def _first_non_finite(data: memoryview) -> int:
+    """Index of the first NaN or infinite value in little-endian float32 bytes, or -1."""
+    high = bytes(data[3::4]).translate(EXPONENT_HIGH)
+    if 1 not in high:
+        return -1
+    low = bytes(data[2::4]).translate(EXPONENT_LOW)
+    both = int.from_bytes(high, "little") & int.from_bytes(low, "little")
+    if not both:
+        return -1
+    return ((both & -both).bit_length() - 1) // 8
+
+
+def parse_matrix(data: memoryview, rows: int, dim: int) -> memoryview:
+    """
+    View `rows` x `dim` little-endian float32 values (raw or .npy) as a flat float
+    memoryview. Shape is checked from the byte count alone; non-finite values are
+    found from the exponent bytes with bulk bytes/int operations, not per float.
+    """
+    if dim != DIMENSIONS:
+        raise ValueError(f"embeddings are stored as {DIMENSIONS}-dimensional vectors, got dim={dim}")
+    if bytes(data[:6]) == NPY_MAGIC:
+        data, shape = _npy_payload(data)
+        if shape not in ((rows, dim),) + (((dim,),) if rows == 1 else ()):
+            raise ValueError(f".npy shape {shape} does not match {rows} slugs x dim {dim}")
+    if len(data) != rows * dim * 4:
+        raise ValueError(f"matrix has {len(data)} bytes, expected {rows} x {dim} float32 = {rows * dim * 4}")
+    bad = _first_non_finite(data)
+    if bad >= 0:
+        raise ValueError(f"row {bad // dim} holds a NaN or infinite value")
+
+    if sys.byteorder == "little":
+        values = data.cast("f")
+    else:
+        swapped = array("f", data.tobytes())
+        swapped.byteswap()
+        values = memoryview(swapped)
+    return values
+
+
+async def event_ids_by_slug(session: AsyncSession, slugs: List[str]) -> Dict[str, int]:
+    ids = {}
+    for chunk in chunks(slugs):
+        stmt = select(models.Event.slug, models.Event.id).where(models.Event.slug.in_(chunk))
+        ids.update({slug: id_ for slug, id_ in (await session.execute(stmt)).all()})
+    return ids
+
+
+async def _copy_rows(rows: List[Tuple[int, int]], values: memoryview, model_name: str, dim: int) -> AsyncIterator[bytes]:
+    """Binary COPY stream of (event_id, model_name, dim, embedding); rows are (event_id, matrix row)."""
+    # vector's binary form: int16 dim, int16 unused, then big-endian float4s
+    big_endian = array("f")
+    big_endian.frombytes(values.cast("B"))
+    if sys.byteorder == "little":
+        big_endian.byteswap()
+    floats = memoryview(big_endian).cast("B")
+    row_bytes = dim * 4
+    name = model_name.encode("utf-8")
+    prefix = struct.pack("!hi", 4, 4)  # field count, event_id length
+    middle = struct.pack(f"!i{len(name)}sii", len(name), name, 4, dim)
+    vector_header = struct.pack("!ihh", 4 + row_bytes, dim, 0)
+
+    yield COPY_HEADER
+    for start in range(0, len(rows), COPY_ROWS_PER_CHUNK):
+        parts = []
+        for event_id, row in rows[start:start + COPY_ROWS_PER_CHUNK]:
+            parts += (prefix, struct.pack("!i", event_id), middle, vector_header,
+                      floats[row * row_bytes:(row + 1) * row_bytes])
+        yield b"".join(parts)
+    yield COPY_TRAILER
+
+
+async def replace_embeddings(
+    session: AsyncSession, slugs: List[str], values: memoryview, model_name: str, dim: int
+) -> EmbeddingUploadResult:
+    """
+    Store row i of `values` as the `model_name` embedding of event `slugs[i]`, replacing
+    that event's previous one. Unknown slugs are skipped and reported; a slug listed
+    twice keeps its last row. Runs in the session's transaction, the caller commits.
+    """
+    result = EmbeddingUploadResult()
+    ids = await event_ids_by_slug(session, list(set(slugs)))
+    latest = {ids[slug]: row for row, slug in enumerate(slugs) if slug in ids}
+    result.missing = list(dict.fromkeys(slug for slug in slugs if slug not in ids))
+    if not latest:
+        return result
+
+    event_ids = list(latest)
+    for chunk in chunks(event_ids):
+        stmt = delete(models.EventEmbedding).where(
+            models.EventEmbedding.model_name == model_name,
+            models.EventEmbedding.event_id.in_(chunk),
+        )
+        result.replaced += (await session.execute(stmt)).rowcount
+
+    # COPY goes straight to the driver connection, inside the transaction the DELETE opened
+    connection = await (await session.connection()).get_raw_connection()
+    await connection.driver_connection.copy_to_table(
+        models.EventEmbedding.__tablename__,
+        source=_copy_rows(sorted(latest.items()), values, model_name, dim),
+        columns=["event_id", "model_name", "dim", "embedding"],
+        format="binary",
+    )
+    result.stored = len(latest)
+    return result
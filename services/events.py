@@ -1,9 +1,13 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, delete, func, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import selectinload, load_only
 from db import models
 import schemas
-from typing import Optional, List
+from services import dimensions, response_cache
+from services.cursor import decode_cursor, encode_cursor
+from services.reconcile import CHILD_MODELS, ChildChanges, content_hash, diff_children, incoming_children, payload_venues
+from typing import Optional, List, Dict, Set, Tuple
 from datetime import datetime
 
 async def get_event_by_slug(session: AsyncSession, slug: str) -> Optional[models.Event]:
@@ -19,48 +23,275 @@ async def get_event_by_slug(session: AsyncSession, slug: str) -> Optional[models
             selectinload(models.Event.images),
             selectinload(models.Event.sources)
         )
+        # Tag links and dimension ids are written around the ORM, refresh what is already loaded
+        .execution_options(populate_existing=True)
     )
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
+# Relationships rendered by EventResponse (sources carry raw_payload and are not rendered)
+RESPONSE_OPTIONS = [
+    selectinload(models.Event.organizer),
+    selectinload(models.Event.default_venue),
+    selectinload(models.Event.tags),
+    selectinload(models.Event.occurrences).selectinload(models.EventOccurrence.venue),
+    selectinload(models.Event.tickets),
+    selectinload(models.Event.images),
+]
+
+SUMMARY_COLUMNS = {"title", "slug", "description", "full_text", "language", "age_restriction", "status", "created_at", "updated_at"}
+SUMMARY_EXTRAS = {"next_occurrence", "primary_image"}
+SUMMARY_RELATIONS = dict(zip(
+    ["organizer", "default_venue", "tags", "occurrences", "tickets", "images"], RESPONSE_OPTIONS
+))
+DEFAULT_SUMMARY_FIELDS = {"title", "slug", "status", "next_occurrence", "primary_image"}
+
+def apply_event_filters(
+    stmt,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    # EXISTS instead of joins: one row per event, so LIMIT counts events
+    if status:
+        stmt = stmt.where(models.Event.status == status)
+    if tag_slug:
+        stmt = stmt.where(models.Event.tags.any(models.Tag.slug == tag_slug))
+    if start_date or end_date:
+        conditions = []
+        if start_date:
+            conditions.append(models.EventOccurrence.start_time >= start_date)
+        if end_date:
+            conditions.append(models.EventOccurrence.start_time <= end_date)
+        stmt = stmt.where(models.Event.occurrences.any(and_(*conditions)))
+    return stmt
+
+async def list_events(
+    session: AsyncSession,
+    limit: int = 100,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    order: schemas.EventOrder = schemas.EventOrder.id,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    options: Optional[list] = None,
+) -> Tuple[List[models.Event], Optional[str]]:
+    """
+    List events with filters. Returns the page and a keyset cursor for the next one
+    (None on the last page). With a cursor, `skip` is ignored and every page costs
+    the same as the first one.
+
+    `order=start_time` sorts by each event's next occurrence at or after `start_date`
+    (or now) and leaves out events without one.
+    `options` are the loader options; by default everything EventResponse renders.
+    """
+    stmt = apply_event_filters(select(models.Event), status, tag_slug, start_date, end_date)
+    if cursor:
+        key_types = (datetime, int) if order == schemas.EventOrder.start_time else (int,)
+        key = decode_cursor(cursor, order.value, key_types)
+    else:
+        key = None
+
+    if order == schemas.EventOrder.start_time:
+        window = [
+            models.EventOccurrence.event_id == models.Event.id,
+            models.EventOccurrence.start_time >= (start_date or func.now()),
+        ]
+        if end_date:
+            window.append(models.EventOccurrence.start_time <= end_date)
+        next_start = (
+            select(func.min(models.EventOccurrence.start_time))
+            .where(*window)
+            .correlate(models.Event)
+            .scalar_subquery()
+        )
+        stmt = (
+            stmt.add_columns(next_start)
+            .where(next_start.is_not(None))
+            .order_by(next_start.asc(), models.Event.id.asc())
+        )
+        if key:
+            stmt = stmt.where(tuple_(next_start, models.Event.id) > tuple_(*key))
+    else:
+        stmt = stmt.order_by(models.Event.id.desc())
+        if key:
+            stmt = stmt.where(models.Event.id < key[0])
+
+    if not key:
+        stmt = stmt.offset(skip)
+    stmt = (
+        stmt.limit(limit)
+        .options(*(RESPONSE_OPTIONS if options is None else options))
+        .execution_options(populate_existing=True)
+    )
+    rows = (await session.execute(stmt)).all()
+    events = [row[0] for row in rows]
+
+    next_cursor = None
+    if limit and len(rows) == limit:
+        last = rows[-1]
+        if order == schemas.EventOrder.start_time:
+            next_cursor = encode_cursor(order.value, [last[1], last[0].id])
+        else:
+            next_cursor = encode_cursor(order.value, [last[0].id])
+    return events, next_cursor
+
+async def list_event_summaries(
+    session: AsyncSession,
+    fields: Optional[Set[str]] = None,
+    include: Optional[Set[str]] = None,
+    **filters,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Lean variant of list_events: only the requested columns are selected and only the
+    requested relationships are loaded. `fields` takes event columns plus
+    `next_occurrence` (first occurrence from now on) and `primary_image` (lowest
+    sort_order); `include` takes relationship names. Raises ValueError for unknown names.
+    Returns JSON-ready dicts holding `id` and exactly what was asked for.
+    """
+    fields = set(fields or DEFAULT_SUMMARY_FIELDS)
+    include = set(include or ())
+    unknown = (fields - SUMMARY_COLUMNS - SUMMARY_EXTRAS - {"id"}) | (include - set(SUMMARY_RELATIONS))
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+
+    columns = fields & SUMMARY_COLUMNS
+    options = [load_only(*(getattr(models.Event, c) for c in columns | {"id"}))]
+    options += [SUMMARY_RELATIONS[name] for name in include]
+    events, next_cursor = await list_events(session, options=options, **filters)
+    ids = [e.id for e in events]
+
+    next_occurrences = {}
+    if "next_occurrence" in fields and ids:
+        stmt = (
+            select(models.EventOccurrence)
+            .where(models.EventOccurrence.event_id.in_(ids), models.EventOccurrence.start_time >= func.now())
+            .order_by(models.EventOccurrence.event_id, models.EventOccurrence.start_time)
+            .distinct(models.EventOccurrence.event_id)
+            .options(selectinload(models.EventOccurrence.venue))
+        )
+        next_occurrences = {o.event_id: o for o in (await session.execute(stmt)).scalars()}
+
+    primary_images = {}
+    if "primary_image" in fields and ids:
+        stmt = (
+            select(models.EventImage)
+            .where(models.EventImage.event_id.in_(ids))
+            .order_by(models.EventImage.event_id, models.EventImage.sort_order, models.EventImage.id)
+            .distinct(models.EventImage.event_id)
+        )
+        primary_images = {i.event_id: i for i in (await session.execute(stmt)).scalars()}
+
+    summaries = []
+    for event in events:
+        data = {"id": event.id}
+        data.update({c: getattr(event, c) for c in columns})
+        data.update({name: getattr(event, name) for name in include})
+        if "next_occurrence" in fields:
+            data["next_occurrence"] = next_occurrences.get(event.id)
+        if "primary_image" in fields:
+            data["primary_image"] = primary_images.get(event.id)
+        summary = schemas.EventSummary.model_validate(data)
+        summaries.append(summary.model_dump(mode="json", include=set(data)))
+    return summaries, next_cursor
+
+async def list_timeline(
+    session: AsyncSession,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+    city: Optional[str] = None,
+) -> Tuple[List[schemas.TimelineItem], Optional[str]]:
+    """
+    Occurrences between `start_date` (default now) and `end_date`, ordered by start time,
+    each with a summary of its event. Driven by idx_occurrence_start, so a date window
+    is an index range scan. Returns the page and a cursor for the next one.
+    """
+    occ = models.EventOccurrence
+    ev = models.Event
+    venue = models.Venue
+
+    stmt = (
+        select(
+            occ.id, occ.start_time, occ.end_time, occ.tz, occ.status, occ.location_name,
+            ev.id, ev.title, ev.slug, ev.description, ev.age_restriction, ev.status,
+            venue.name, venue.address, venue.city, venue.lat, venue.lon,
+        )
+        .join(ev, ev.id == occ.event_id)
+        .outerjoin(venue, venue.id == func.coalesce(occ.venue_id, ev.venue_id))
+        .where(occ.start_time >= (start_date or func.now()))
+        .order_by(occ.start_time.asc(), occ.id.asc())
+        .limit(limit)
+    )
+    if end_date:
+        stmt = stmt.where(occ.start_time <= end_date)
+    if status:
+        stmt = stmt.where(ev.status == status)
+    if tag_slug:
+        stmt = stmt.where(ev.tags.any(models.Tag.slug == tag_slug))
+    if city:
+        stmt = stmt.where(venue.city == city)
+    if cursor:
+        key = decode_cursor(cursor, "timeline", (datetime, int))
+        stmt = stmt.where(tuple_(occ.start_time, occ.id) > tuple_(*key))
+
+    rows = (await session.execute(stmt)).all()
+    items = [
+        schemas.TimelineItem(
+            occurrence_id=row[0],
+            start_time=row[1],
+            end_time=row[2],
+            tz=row[3],
+            status=row[4],
+            location_name=row[5],
+            event=schemas.TimelineEventSchema(
+                id=row[6], title=row[7], slug=row[8], description=row[9], age_restriction=row[10], status=row[11]
+            ),
+            venue=schemas.VenueSchema(
+                name=row[12], address=row[13], city=row[14], lat=row[15], lon=row[16]
+            ) if row[12] is not None else None,
+        )
+        for row in rows
+    ]
+
+    next_cursor = None
+    if limit and len(rows) == limit:
+        next_cursor = encode_cursor("timeline", [rows[-1][1], rows[-1][0]])
+    return items, next_cursor
+
 async def create_or_update_event(session: AsyncSession, event_data: schemas.EventCreate) -> models.Event:
+    event, _ = await upsert_event(session, event_data)
+    return event
+
+async def upsert_event(
+    session: AsyncSession, event_data: schemas.EventCreate
+) -> Tuple[models.Event, Dict[str, ChildChanges]]:
+    """
+    Create or update an event by slug. Child rows are reconciled by natural key, so
+    only rows that actually differ are inserted, updated or deleted.
+    Returns the event and the per-relation counts of changed child rows.
+    """
     # 1. Handle Organizer
-    organizer = None
+    organizer_id = None
     if event_data.organizer:
-        stmt = select(models.Organizer).where(models.Organizer.name == event_data.organizer.name)
-        res = await session.execute(stmt)
-        organizer = res.scalar_one_or_none()
-        if not organizer:
-            organizer = models.Organizer(
-                name=event_data.organizer.name,
-                rating=event_data.organizer.rating or 0.0,
-                social_links=event_data.organizer.social_links
-            )
-            session.add(organizer)
-            await session.flush()
+        ids = await dimensions.resolve_organizer_ids(session, {event_data.organizer.name: event_data.organizer})
+        organizer_id = ids[event_data.organizer.name]
 
-    # 2. Handle Venue
-    venue = None
+    # 2. Handle Venues (default and occurrence overrides)
+    venue_id = None
+    venue_ids = await dimensions.resolve_venue_ids(session, payload_venues(event_data))
     if event_data.default_venue:
-        stmt = select(models.Venue).where(
-            models.Venue.name == event_data.default_venue.name, 
-            models.Venue.city == event_data.default_venue.city
-        )
-        res = await session.execute(stmt)
-        venue = res.scalar_one_or_none()
-        if not venue:
-            venue = models.Venue(
-                name=event_data.default_venue.name,
-                address=event_data.default_venue.address,
-                city=event_data.default_venue.city,
-                lat=event_data.default_venue.lat,
-                lon=event_data.default_venue.lon
-            )
-            session.add(venue)
-            await session.flush()
+        venue_id = venue_ids[(event_data.default_venue.name, event_data.default_venue.city)]
 
     # 3. Check for Existing Event
     existing_event = await get_event_by_slug(session, event_data.slug)
+    response_cache.mark_changed(session, [event_data.slug])
 
     if existing_event:
         # UPDATE
@@ -72,70 +303,13 @@ async def create_or_update_event(session: AsyncSession, event_data: schemas.Even
         existing_event.updated_at = datetime.now()
         existing_event.language = event_data.language
         existing_event.age_restriction = event_data.age_restriction
+        existing_event.content_hash = content_hash(event_data)
         
-        if organizer: existing_event.organizer = organizer
-        if venue: existing_event.default_venue = venue
-        
-        # Tags
-        if event_data.tags is not None:
-            existing_event.tags = [] # Clear and rebuild
-            for t in event_data.tags:
-                tag_obj = await _get_or_create_tag(session, t)
-                existing_event.tags.append(tag_obj)
-
-        # Occurrences
-        if event_data.occurrences is not None:
-            existing_event.occurrences = [] # Clear and rebuild
-            for occ in event_data.occurrences:
-                new_occ = models.EventOccurrence(
-                    start_time=occ.start_time,
-                    end_time=occ.end_time,
-                    tz=occ.tz,
-                    status=occ.status,
-                    location_name=occ.location_name
-                )
-                  # TODO: If occurrence has venue override?
-                existing_event.occurrences.append(new_occ)
-
-        # Tickets
-        if event_data.tickets is not None:
-            existing_event.tickets = []
-            for tkt in event_data.tickets:
-                new_tkt = models.TicketType(
-                    name=tkt.name,
-                    price=tkt.price,
-                    currency=tkt.currency,
-                    capacity=tkt.capacity,
-                    sold=tkt.sold
-                )
-                existing_event.tickets.append(new_tkt)
-
-        # Images
-        if event_data.images is not None:
-            existing_event.images = []
-            for img in event_data.images:
-                new_img = models.EventImage(
-                    url=img.url,
-                    alt=img.alt,
-                    sort_order=img.sort_order
-                )
-                existing_event.images.append(new_img)
-        
-        # Sources - append or replace? For sync, usually replace or ensuring consistency.
-        # User didn't specify, but for full sync, replacing list is safest.
-        if event_data.sources is not None:
-             existing_event.sources = []
-             for src in event_data.sources:
-                 new_src = models.EventSource(
-                     source_url=src.source_url,
-                     source_name=src.source_name,
-                     confidence=src.confidence,
-                     fingerprint=src.fingerprint,
-                     raw_payload=src.raw_payload
-                 )
-                 existing_event.sources.append(new_src)
-
-        return existing_event
+        if organizer_id: existing_event.organizer_id = organizer_id
+        if venue_id: existing_event.venue_id = venue_id
+
+        changes = await _sync_children(session, existing_event, event_data, venue_ids)
+        return existing_event, changes
 
     else:
         # INSERT
@@ -147,86 +321,62 @@ async def create_or_update_event(session: AsyncSession, event_data: schemas.Even
             language=event_data.language,
             age_restriction=event_data.age_restriction,
             status=event_data.status,
-            organizer=organizer,
-            default_venue=venue
+            content_hash=content_hash(event_data),
+            organizer_id=organizer_id,
+            venue_id=venue_id
         )
         session.add(new_event)
-        # Occurrences
-        if event_data.occurrences:
-            for occ in event_data.occurrences:
-                new_occ = models.EventOccurrence(
-                    start_time=occ.start_time,
-                    end_time=occ.end_time,
-                    tz=occ.tz,
-                    status=occ.status,
-                    location_name=occ.location_name
-                )
-                new_event.occurrences.append(new_occ)
-        
-        # Tags
-        if event_data.tags:
-            for t in event_data.tags:
-                 tag_obj = await _get_or_create_tag(session, t)
-                 new_event.tags.append(tag_obj)
-
-        # Tickets
-        if event_data.tickets:
-             for tkt in event_data.tickets:
-                new_tkt = models.TicketType(
-                    name=tkt.name,
-                    price=tkt.price,
-                    currency=tkt.currency,
-                    capacity=tkt.capacity,
-                    sold=tkt.sold
-                )
-                new_event.tickets.append(new_tkt)
-        
-        # Images
-        if event_data.images:
-            for img in event_data.images:
-                new_img = models.EventImage(
-                    url=img.url,
-                    alt=img.alt,
-                    sort_order=img.sort_order
-                )
-                new_event.images.append(new_img)
-
-        # Sources
-        if event_data.sources:
-            for src in event_data.sources:
-                 new_src = models.EventSource(
-                     source_url=src.source_url,
-                     source_name=src.source_name,
-                     confidence=src.confidence,
-                     fingerprint=src.fingerprint,
-                     raw_payload=src.raw_payload
-                 )
-                 new_event.sources.append(new_src)
-
-        return new_event
-
-async def _get_or_create_tag(session: AsyncSession, tag_data: schemas.TagSchema):
-    # 1. Check pending objects in session (for batch operations) to avoid duplicate inserts
-    for obj in session.new:
-        if isinstance(obj, models.Tag):
-            if obj.slug == tag_data.slug or obj.name == tag_data.name:
-                return obj
-
-    # 2. Check Database by slug OR name to avoid UniqueViolation
-    stmt = select(models.Tag).where(
-        (models.Tag.slug == tag_data.slug) | (models.Tag.name == tag_data.name)
-    )
-    res = await session.execute(stmt)
-    tag_obj = res.scalar_one_or_none()
-    
-    if not tag_obj:
-        tag_obj = models.Tag(name=tag_data.name, slug=tag_data.slug)
-        session.add(tag_obj)
-        # No flush here to avoid performance hit; rely on session.new check above for duplicates in same batch
-        
-    return tag_obj
+
+        changes = await _sync_children(session, new_event, event_data, venue_ids)
+        return new_event, changes
+
+async def _sync_children(
+    session: AsyncSession,
+    event: models.Event,
+    event_data: schemas.EventCreate,
+    venue_ids: Dict[Tuple[str, str], int],
+) -> Dict[str, ChildChanges]:
+    changes = {}
+    # Occurrences, tickets, images, sources: matched by natural key.
+    # An occurrence's override venue is stored as its venue_id.
+    for relation, model in CHILD_MODELS.items():
+        collection = getattr(event, relation)
+        # Sources merged in from duplicates belong to those payloads (services/dedup.py)
+        own = [row for row in collection if getattr(row, "merged_from", None) is None]
+        diff = diff_children(relation, own, incoming_children(event_data, relation, venue_ids))
+        for row in diff.to_delete:
+            collection.remove(row)
+        for row, values in diff.to_update:
+            for field, value in values.items():
+                setattr(row, field, value)
+        for values in diff.to_insert:
+            collection.append(model(**values))
+        changes[relation] = diff.changes
+
+    # Tags: link rows are written directly, so only links that appear or disappear
+    # are touched. The event needs an id for that.
+    current = {t.id for t in event.tags}
+    if event.id is None:
+        await session.flush()
+    tag_ids = await dimensions.resolve_tag_ids(session, {t.slug: t for t in event_data.tags})
+    wanted = set(tag_ids.values())
+    if current - wanted:
+        await session.execute(
+            delete(models.EventTag).where(
+                models.EventTag.event_id == event.id, models.EventTag.tag_id.in_(current - wanted)
+            )
+        )
+    if wanted - current:
+        await session.execute(
+            insert(models.EventTag).values([{"event_id": event.id, "tag_id": t} for t in wanted - current])
+        )
+    changes["tags"] = ChildChanges(inserted=len(wanted - current), deleted=len(current - wanted))
+
+    return changes
 
 async def delete_event(session: AsyncSession, slug: str) -> bool:
     stmt = delete(models.Event).where(models.Event.slug == slug)
     result = await session.execute(stmt)
+    if result.rowcount:
+        response_cache.mark_changed(session, [slug])
     return result.rowcount > 0
@@ -0,0 +1,174 @@
+"""
+"Events near me": upcoming occurrences within a radius of a point.
+
+Venues are found through the idx_venue_location GiST index on `point(lon, lat)`: the
+radius is widened to a lat/lon bounding box for the index, then trimmed to the exact
+great-circle (haversine) distance. Occurrences are then picked by venue, honouring
+occurrence-level venue overrides: an occurrence with its own venue is located there,
+one without inherits the event's default venue. Both lookups are index scans
+(idx_occurrence_venue, ix_events_venue_id), so cost follows the number of nearby
+venues, not the size of the tables.
+"""
+import math
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+import schemas
+from services.cursor import decode_cursor, encode_cursor
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_RADIUS_KM = 200.0
+ORDERS = ("distance", "start_time")
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) enclosing the circle; clipped at the poles and the antimeridian."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+    return max(-180.0, lon - dlon), max(-90.0, lat - dlat), min(180.0, lon + dlon), min(90.0, lat + dlat)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_km(lat: float, lon: float):
+    """SQL expression: haversine distance from (lat, lon) to the venue, in kilometres."""
+    venue = models.Venue
+    dlat = func.radians(venue.lat - lat)
+    dlon = func.radians(venue.lon - lon)
+    a = (
+        func.power(func.sin(dlat / 2), 2)
+        + math.cos(math.radians(lat)) * func.cos(func.radians(venue.lat)) * func.power(func.sin(dlon / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def nearby_venues(lat: float, lon: float, radius_km: float):
+    """(venue_id, distance) of venues within `radius_km`, through the GiST index."""
+    venue = models.Venue
+    min_lon, min_lat, max_lon, max_lat = bounding_box(lat, lon, radius_km)
+    box = func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat))
+    distance = distance_km(lat, lon)
+    return (
+        select(venue.id.label("venue_id"), distance.label("distance"))
+        .where(func.point(venue.lon, venue.lat).op("<@")(box))
+        .where(distance <= radius_km)
+    )
+
+
+async def list_nearby(
+    session: AsyncSession,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    order: str = "distance",
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+) -> Tuple[List[schemas.NearbyItem], Optional[str]]:
+    """
+    Occurrences from `start_date` (default now) up to `end_date` at venues within
+    `radius_km` of (lat, lon), nearest first (ties by start time) or soonest first.
+    Returns the page and a cursor for the next one.
+    """
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise ValueError("lat must be within [-90, 90] and lon within [-180, 180]")
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f"radius_km must be within (0, {MAX_RADIUS_KM:g}]")
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of: {', '.join(ORDERS)}")
+
+    occ = models.EventOccurrence
+    ev = models.Event
+    venue = models.Venue
+
+    # Each branch joins the nearby venues itself and carries their distance: the GiST
+    # row estimate is poor, and re-joining the CTE afterwards degrades to a nested loop.
+    nearby = nearby_venues(lat, lon, radius_km).cte("nearby")
+    columns = (occ.id.label("occurrence_id"), occ.start_time, nearby.c.venue_id, nearby.c.distance)
+    own = (
+        select(*columns)
+        .join(nearby, nearby.c.venue_id == occ.venue_id)
+        .join(ev, ev.id == occ.event_id)
+    )
+    inherited = (
+        select(*columns)
+        .select_from(nearby)
+        .join(ev, ev.venue_id == nearby.c.venue_id)
+        .join(occ, occ.event_id == ev.id)
+        .where(occ.venue_id.is_(None))
+    )
+    branches = []
+    for branch in (own, inherited):
+        branch = branch.where(occ.start_time >= (start_date or func.now()))
+        if end_date:
+            branch = branch.where(occ.start_time <= end_date)
+        if status:
+            branch = branch.where(ev.status == status)
+        if tag_slug:
+            branch = branch.where(ev.tags.any(models.Tag.slug == tag_slug))
+        branches.append(branch)
+    located = union_all(*branches).subquery("located")
+
+    # Sort and cut the page on the narrow rows, then fetch the details of that page only
+    kind = f"nearby-{order}"
+    if order == "distance":
+        key = (located.c.distance, located.c.start_time, located.c.occurrence_id)
+    else:
+        key = (located.c.start_time, located.c.occurrence_id)
+    page = select(located).order_by(*key).limit(limit)
+    if cursor:
+        values = decode_cursor(cursor, kind, (float, datetime, int) if order == "distance" else (datetime, int))
+        page = page.where(tuple_(*key) > tuple_(*values))
+    page = page.subquery("page")
+
+    stmt = (
+        select(
+            occ.id, occ.start_time, occ.end_time, occ.tz, occ.status, occ.location_name,
+            ev.id, ev.title, ev.slug, ev.description, ev.age_restriction, ev.status,
+            venue.name, venue.address, venue.city, venue.lat, venue.lon,
+            page.c.distance,
+        )
+        .select_from(page)
+        .join(occ, occ.id == page.c.occurrence_id)
+        .join(ev, ev.id == occ.event_id)
+        .join(venue, venue.id == page.c.venue_id)
+        .order_by(*(page.c[column.name] for column in key))
+    )
+
+    rows = (await session.execute(stmt)).all()
+    items = [
+        schemas.NearbyItem(
+            occurrence_id=row[0],
+            start_time=row[1],
+            end_time=row[2],
+            tz=row[3],
+            status=row[4],
+            location_name=row[5],
+            event=schemas.TimelineEventSchema(
+                id=row[6], title=row[7], slug=row[8], description=row[9], age_restriction=row[10], status=row[11]
+            ),
+            venue=schemas.VenueSchema(name=row[12], address=row[13], city=row[14], lat=row[15], lon=row[16]),
+            distance_km=row[17],
+        )
+        for row in rows
+    ]
+
+    next_cursor = None
+    if limit and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(kind, [last[17], last[1], last[0]] if order == "distance" else [last[1], last[0]])
+    return items, next_cursor
@@ -0,0 +1,127 @@
+"""
+Streaming NDJSON ingest: one EventCreate per line, validated lazily and committed every
+`chunk_size` events, so an arbitrarily large dump is processed with bounded memory and
+short transactions. A line longer than INGEST_MAX_LINE_BYTES is reported as an error
+and skipped without being held in memory.
+"""
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import schemas
+from services import bulk as bulk_service
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(4 * 1024 * 1024)))
+
+
+async def iter_lines(
+    body: AsyncIterator[bytes], max_bytes: int = MAX_LINE_BYTES
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    (line number, line) for every non-blank line of a byte stream, numbered from 1.
+    A line longer than `max_bytes` is yielded as (number, None); its bytes are dropped
+    as they arrive. Only each new block is split, so the cost stays linear.
+    """
+    tail: List[bytes] = []  # start of the current line, carried over from earlier blocks
+    tail_size = 0
+    oversized = False
+    number = 0
+    async for block in body:
+        *lines, rest = block.split(b"\n")
+        for segment in lines:
+            number += 1
+            if oversized or tail_size + len(segment) > max_bytes:
+                yield number, None
+            else:
+                line = b"".join(tail) + segment if tail else segment
+                if line.strip():
+                    yield number, line
+            tail, tail_size, oversized = [], 0, False
+        if not oversized:
+            tail_size += len(rest)
+            if tail_size > max_bytes:
+                tail, oversized = [], True
+            elif rest:
+                tail.append(rest)
+    if oversized:
+        yield number + 1, None
+    elif tail:
+        line = b"".join(tail)
+        if line.strip():
+            yield number + 1, line
+
+
+def _error(number: int, message: str, slug: str = None, details: Any = None) -> Dict[str, Any]:
+    result = {"line": number, "status": "error", "error": message}
+    if slug:
+        result["slug"] = slug
+    if details is not None:
+        result["details"] = details
+    return result
+
+
+async def ingest_ndjson(
+    session_factory: Callable[[], AsyncSession],
+    body: AsyncIterator[bytes],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    skip_unchanged: bool = False,
+    dedupe: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield one result per input line: {"line", "slug", "status": "ok", "action"} once the
+    chunk holding it is committed, or {"line", "status": "error", "error"} for lines that
+    do not parse or that the database rejected (with the SQLSTATE under "details"); the
+    rest of such a chunk still commits. Invalid lines are reported right away.
+    Merged duplicates get action "merged" plus "canonical", the slug they were merged into.
+    """
+    pending: List[Tuple[int, schemas.EventCreate]] = []
+
+    async def flush(session: AsyncSession) -> List[Dict[str, Any]]:
+        events = [event_data for _, event_data in pending]
+        try:
+            result = await bulk_service.bulk_upsert_isolated(
+                session, events, skip_unchanged=skip_unchanged, dedupe=dedupe
+            )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            return [_error(number, f"chunk failed: {e}", event_data.slug) for number, event_data in pending]
+        failed = {failure["slug"]: failure for failure in result.failed}
+
+        actions = {slug: "created" for slug in result.created}
+        actions.update({slug: "updated" for slug in result.updated})
+        actions.update({slug: "skipped" for slug in result.skipped})
+        actions.update({decision.slug: "merged" for decision in result.merged})
+        canonical = {decision.slug: decision.canonical for decision in result.merged}
+        results = []
+        for number, event_data in pending:
+            if event_data.slug in failed:
+                failure = failed[event_data.slug]
+                results.append(_error(number, failure["error"], event_data.slug, {"code": failure["code"]}))
+                continue
+            item = {"line": number, "slug": event_data.slug, "status": "ok", "action": actions.get(event_data.slug)}
+            if event_data.slug in canonical:
+                item["canonical"] = canonical[event_data.slug]
+            results.append(item)
+        return results
+
+    async with session_factory() as session:
+        async for number, line in iter_lines(body):
+            if line is None:
+                yield _error(number, f"line longer than {MAX_LINE_BYTES} bytes")
+                continue
+            try:
+                pending.append((number, schemas.EventCreate.model_validate_json(line)))
+            except ValidationError as e:
+                yield _error(number, "invalid event", details=e.errors(include_url=False, include_context=False, include_input=False))
+                continue
+            if len(pending) >= chunk_size:
+                for result in await flush(session):
+                    yield result
+                pending.clear()
+        if pending:
+            for result in await flush(session):
+                yield result
@@ -0,0 +1,324 @@
+"""
+Asynchronous batch ingest.
+
+POST /events/jobs stores the validated batch as one `ingest_jobs` row and returns at
+once. A bounded pool of asyncio workers (INGEST_JOB_WORKERS per process) claims jobs
+with FOR UPDATE SKIP LOCKED and writes them INGEST_JOB_CHUNK_SIZE events at a time;
+each chunk commits together with the job's progress, so a restarted job resumes after
+its last committed chunk. Events the database rejects are reported per event while
+the rest of their chunk commits. A claim is a lease (INGEST_JOB_LEASE_SECONDS), renewed
+by a heartbeat every third of it while the worker runs the job, however long a chunk
+takes: jobs of a worker that died are picked up again once it expires.
+
+Repeated slugs are coalesced when a job is queued (the last payload wins), and a
+chunk skips slugs that a newer job has already written ("superseded"); a newer job
+that has not reached them yet writes after this one anyway. Chunks take per-slug
+advisory locks first, so that check cannot race a newer job committing the same slugs.
+Finished jobs keep their slugs and progress but drop the payload.
+"""
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from db import models
+import schemas
+from services import bulk as bulk_service
+from services import similar as similar_service
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+CHUNK_SIZE = int(os.getenv("INGEST_JOB_CHUNK_SIZE", "500"))
+LEASE_SECONDS = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "300"))
+POLL_SECONDS = float(os.getenv("INGEST_JOB_POLL_SECONDS", "2"))
+MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", "3"))
+MAX_ERRORS = 1000  # per job; `counts["failed"]` and `failed_slugs` keep them all
+
+ACTIVE = ("queued", "running")
+SLUG_LOCK_NAMESPACE = 0x4A4F42  # first key of the per-slug advisory locks
+
+# Sorted, so two jobs locking overlapping chunks cannot deadlock; volatile functions
+# in the select list run after ORDER BY.
+LOCK_SLUGS_SQL = text("""
+    SELECT pg_advisory_xact_lock(:namespace, key)
+    FROM (SELECT DISTINCT hashtext(slug) AS key FROM unnest(CAST(:slugs AS text[])) AS slug) AS keys
+    ORDER BY key
+""")
+# Slugs a newer job has written: within its processed prefix and not among its failures
+SUPERSEDED_SQL = text("""
+    SELECT DISTINCT written.slug
+    FROM ingest_jobs AS job
+    CROSS JOIN LATERAL unnest(job.slugs) WITH ORDINALITY AS written(slug, position)
+    WHERE job.id > :job_id
+      AND job.slugs && CAST(:slugs AS varchar[])
+      AND written.position <= job.processed
+      AND written.slug = ANY(CAST(:slugs AS varchar[]))
+      AND written.slug <> ALL(job.failed_slugs)
+""")
+COUNTERS = ("created", "updated", "skipped", "merged", "superseded", "failed")
+
+
+def coalesce(events: List[schemas.EventCreate]) -> List[schemas.EventCreate]:
+    """One payload per slug: the last one sent, in order of last appearance."""
+    latest: Dict[str, schemas.EventCreate] = {}
+    for event_data in events:
+        latest.pop(event_data.slug, None)
+        latest[event_data.slug] = event_data
+    return list(latest.values())
+
+
+async def enqueue(
+    session: AsyncSession, events: List[schemas.EventCreate], skip_unchanged: bool = False, dedupe: bool = False
+) -> models.IngestJob:
+    """Add a job for `events`. The caller commits, then calls `wake()`."""
+    unique = coalesce(events)
+    job = models.IngestJob(
+        status="queued",
+        options={"skip_unchanged": skip_unchanged, "dedupe": dedupe},
+        payload=[event_data.model_dump(mode="json") for event_data in unique],
+        slugs=[event_data.slug for event_data in unique],
+        total=len(unique),
+        processed=0,
+        coalesced=len(events) - len(unique),
+        counts={counter: 0 for counter in COUNTERS},
+        errors=[],
+        failed_slugs=[],
+        attempts=0,
+    )
+    session.add(job)
+    await session.flush()
+    await session.refresh(job)
+    return job
+
+
+REPORT_COLUMNS = (
+    "id", "status", "total", "processed", "coalesced", "counts", "errors",
+    "attempts", "created_at", "started_at", "finished_at",
+)
+
+
+async def get_job(session: AsyncSession, job_id: int) -> Optional[models.IngestJob]:
+    """The job with what `report` shows; payload and slugs stay in the database."""
+    job = models.IngestJob
+    stmt = (
+        select(job)
+        .where(job.id == job_id)
+        .options(load_only(*(getattr(job, column) for column in REPORT_COLUMNS), raiseload=True))
+    )
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+def report(job: models.IngestJob) -> Dict[str, Any]:
+    """Progress of a job as returned by GET /events/jobs/{id}; the payload is left out."""
+    return {
+        "id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "coalesced": job.coalesced,
+        **{counter: (job.counts or {}).get(counter, 0) for counter in COUNTERS},
+        "errors": job.errors or [],
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def claim(session: AsyncSession) -> Optional[models.IngestJob]:
+    """
+    Take the oldest queued job, or a running one whose lease expired, and lease it.
+    SKIP LOCKED lets concurrent workers (in any process) claim different jobs.
+    """
+    job = models.IngestJob
+    next_id = (
+        select(job.id)
+        .where(job.status.in_(ACTIVE))
+        .where((job.status == "queued") | (job.locked_until < func.now()))
+        .order_by(job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(job)
+        .where(job.id == next_id)
+        .values(
+            status="running",
+            attempts=job.attempts + 1,
+            locked_until=func.now() + timedelta(seconds=LEASE_SECONDS),
+            started_at=func.coalesce(job.started_at, func.now()),
+        )
+        .returning(job)
+    )
+    claimed = (await session.execute(stmt)).scalar_one_or_none()
+    await session.commit()
+    return claimed
+
+
+async def _lock_slugs(session: AsyncSession, slugs: List[str]) -> None:
+    """Hold `slugs` against other jobs until the session's transaction ends."""
+    await session.execute(LOCK_SLUGS_SQL, {"namespace": SLUG_LOCK_NAMESPACE, "slugs": slugs})
+
+
+async def _superseded(session: AsyncSession, job_id: int, slugs: List[str]) -> set:
+    """Slugs of `slugs` that a newer job has already written; its payload is the fresher one."""
+    return set((await session.execute(SUPERSEDED_SQL, {"job_id": job_id, "slugs": slugs})).scalars())
+
+
+async def run_job(session_factory: Callable[[], AsyncSession], job: models.IngestJob) -> None:
+    """Write the rest of a claimed job, chunk by chunk, then mark it done."""
+    table = models.IngestJob
+    options = {"skip_unchanged": False, "dedupe": False, **(job.options or {})}
+    for start in range(job.processed, job.total, CHUNK_SIZE):
+        payloads = job.payload[start:start + CHUNK_SIZE]
+        slugs = [p["slug"] for p in payloads]
+        async with session_factory() as session:
+            await _lock_slugs(session, slugs)
+            superseded = await _superseded(session, job.id, slugs)
+            events = [schemas.EventCreate.model_validate(p) for p in payloads if p["slug"] not in superseded]
+            # Rejected events are reported, the rest of the chunk commits
+            result = await bulk_service.bulk_upsert_isolated(session, events, **options)
+            errors = result.failed
+            counts = dict(job.counts or {})
+            for counter, value in (
+                ("created", len(result.created)),
+                ("updated", len(result.updated)),
+                ("skipped", len(result.skipped)),
+                ("merged", len(result.merged)),
+                ("superseded", len(superseded)),
+                ("failed", len(errors)),
+            ):
+                counts[counter] = counts.get(counter, 0) + value
+            job.counts = counts
+            job.errors = ((job.errors or []) + errors)[:MAX_ERRORS]
+            job.failed_slugs = (job.failed_slugs or []) + [error["slug"] for error in errors]
+            job.processed = start + len(payloads)
+            await session.execute(
+                update(table)
+                .where(table.id == job.id)
+                .values(processed=job.processed, counts=job.counts, errors=job.errors, failed_slugs=job.failed_slugs)
+            )
+            await session.commit()
+
+        try:
+            await similar_service.refresh_neighbors(session_factory, result.created + result.updated)
+        except Exception:
+            logger.exception("Job %s: similar events refresh failed", job.id)
+
+    async with session_factory() as session:
+        await session.execute(
+            update(table)
+            .where(table.id == job.id)
+            .values(status="done", finished_at=func.now(), locked_until=None, payload=[])
+        )
+        await session.commit()
+
+
+async def _renew_lease(session_factory: Callable[[], AsyncSession], job_id: int) -> None:
+    """Extend the lease on a job every third of LEASE_SECONDS until cancelled."""
+    table = models.IngestJob
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        try:
+            async with session_factory() as session:
+                await session.execute(
+                    update(table)
+                    .where(table.id == job_id, table.status == "running")
+                    .values(locked_until=func.now() + timedelta(seconds=LEASE_SECONDS))
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("Job %s: renewing the lease failed", job_id)
+
+
+async def _fail(session_factory: Callable[[], AsyncSession], job_id: int, message: str) -> None:
+    table = models.IngestJob
+    async with session_factory() as session:
+        row = (await session.execute(select(table.errors).where(table.id == job_id))).first()
+        if row is None:  # deleted meanwhile
+            return
+        await session.execute(
+            update(table)
+            .where(table.id == job_id)
+            .values(
+                status="failed",
+                finished_at=func.now(),
+                locked_until=None,
+                errors=((row.errors or []) + [{"slug": None, "error": message}])[:MAX_ERRORS],
+            )
+        )
+        await session.commit()
+
+
+class WorkerPool:
+    """`size` asyncio workers draining the job table; `wake()` skips the poll delay."""
+
+    def __init__(self, size: int = WORKERS):
+        self.size = size
+        self.tasks: List[asyncio.Task] = []
+        self.running: Dict[str, int] = {}  # worker -> job id
+        self.finished = 0
+        self._wakeup = asyncio.Event()
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        for n in range(self.size - len(self.tasks)):
+            name = f"ingest-worker-{len(self.tasks) + 1}"
+            self.tasks.append(asyncio.create_task(self._work(session_factory, name), name=name))
+
+    async def stop(self) -> None:
+        """Cancel the workers. Jobs in progress keep their committed chunks and are resumed after their lease."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        self.running.clear()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def _work(self, session_factory: Callable[[], AsyncSession], name: str) -> None:
+        while True:
+            try:
+                async with session_factory() as session:
+                    job = await claim(session)
+            except Exception:
+                logger.exception("%s: claiming a job failed", name)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.running[name] = job.id
+            heartbeat = asyncio.create_task(_renew_lease(session_factory, job.id), name=f"{name}-lease")
+            try:
+                if job.attempts > MAX_ATTEMPTS:
+                    await _fail(session_factory, job.id, f"gave up after {MAX_ATTEMPTS} attempts")
+                else:
+                    await run_job(session_factory, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The lease runs out and another attempt resumes after the last committed chunk
+                logger.exception("%s: job %s failed", name, job.id)
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+                self.running.pop(name, None)
+                self.finished += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self.tasks), "running": dict(self.running), "finished": self.finished}
+
+
+pool = WorkerPool()
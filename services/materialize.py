@@ -0,0 +1,175 @@
+"""
+Single-statement event materialization.
+
+Builds the complete EventResponse document inside Postgres with json_build_object /
+json_agg subqueries and hands back the serialized JSON, so reading an event costs one
+round trip and no ORM objects or Pydantic validation.
+"""
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy import Text, bindparam, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from db import models
+import schemas
+from services.events import apply_event_filters
+
+EMPTY_ARRAY = literal_column("'[]'::json")
+
+
+def _venue_object(venue_id_column):
+    venue = aliased(models.Venue)
+    return (
+        select(
+            func.json_build_object(
+                "name", venue.name,
+                "address", venue.address,
+                "city", venue.city,
+                "lat", venue.lat,
+                "lon", venue.lon,
+            )
+        )
+        .where(venue.id == venue_id_column)
+        .scalar_subquery()
+    )
+
+
+def event_document():
+    """
+    Correlated json expression rendering one `events` row exactly like EventResponse
+    (same keys, nested objects and lists). Usable in any select over models.Event.
+    """
+    ev = models.Event
+    organizer = aliased(models.Organizer)
+    occ = aliased(models.EventOccurrence)
+    tkt = aliased(models.TicketType)
+    img = aliased(models.EventImage)
+    tag = aliased(models.Tag)
+    link = aliased(models.EventTag)
+
+    organizer_object = (
+        select(
+            func.json_build_object(
+                "name", organizer.name,
+                "rating", organizer.rating,
+                "social_links", organizer.social_links,
+            )
+        )
+        .where(organizer.id == ev.organizer_id)
+        .scalar_subquery()
+    )
+    tags = (
+        select(func.json_agg(aggregate_order_by(func.json_build_object("name", tag.name, "slug", tag.slug), tag.id)))
+        .select_from(link)
+        .join(tag, tag.id == link.tag_id)
+        .where(link.event_id == ev.id)
+        .scalar_subquery()
+    )
+    occurrences = (
+        select(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    "start_time", occ.start_time,
+                    "end_time", occ.end_time,
+                    "tz", occ.tz,
+                    "status", occ.status,
+                    "location_name", occ.location_name,
+                    "venue", _venue_object(occ.venue_id),
+                ),
+                occ.start_time,
+            ))
+        )
+        .where(occ.event_id == ev.id)
+        .scalar_subquery()
+    )
+    tickets = (
+        select(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    "name", tkt.name,
+                    "price", tkt.price,
+                    "currency", tkt.currency,
+                    "capacity", tkt.capacity,
+                    "sold", tkt.sold,
+                ),
+                tkt.id,
+            ))
+        )
+        .where(tkt.event_id == ev.id)
+        .scalar_subquery()
+    )
+    images = (
+        select(func.json_agg(aggregate_order_by(
+            func.json_build_object("url", img.url, "alt", img.alt, "sort_order", img.sort_order),
+            img.sort_order.asc(), img.id.asc(),
+        )))
+        .where(img.event_id == ev.id)
+        .scalar_subquery()
+    )
+
+    return func.json_build_object(
+        "title", ev.title,
+        "slug", ev.slug,
+        "description", ev.description,
+        "full_text", ev.full_text,
+        "language", ev.language,
+        "age_restriction", ev.age_restriction,
+        "status", ev.status,
+        "id", ev.id,
+        "created_at", ev.created_at,
+        "updated_at", ev.updated_at,
+        "organizer", organizer_object,
+        "default_venue", _venue_object(ev.venue_id),
+        "tags", func.coalesce(tags, EMPTY_ARRAY),
+        "occurrences", func.coalesce(occurrences, EMPTY_ARRAY),
+        "tickets", func.coalesce(tickets, EMPTY_ARRAY),
+        "images", func.coalesce(images, EMPTY_ARRAY),
+    )
+
+
+# Built once: constructing the expression tree costs more than running the query
+EVENT_BY_SLUG = select(
+    cast(event_document(), Text),
+    models.Event.id,
+    func.coalesce(models.Event.updated_at, models.Event.created_at),
+).where(models.Event.slug == bindparam("slug"))
+
+
+async def get_event_json(session: AsyncSession, slug: str) -> Optional[bytes]:
+    """The EventResponse document for `slug` as JSON bytes, or None if there is no such event."""
+    found = await get_event_json_versioned(session, slug)
+    return found[0] if found is not None else None
+
+
+async def get_event_json_versioned(session: AsyncSession, slug: str) -> Optional[Tuple[bytes, int, datetime]]:
+    """Like get_event_json, plus the event id and its last modification time (for ETags)."""
+    row = (await session.execute(EVENT_BY_SLUG, {"slug": slug})).one_or_none()
+    if row is None:
+        return None
+    document, event_id, version = row
+    return document.encode("utf-8"), event_id, version
+
+
+async def stream_event_documents(
+    session: AsyncSession,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    chunk_size: int = 500,
+) -> AsyncIterator[bytes]:
+    """
+    Every matching event as newline-delimited JSON, in id order. Rows come from a
+    server-side cursor `chunk_size` at a time and each chunk is yielded as one bytes
+    block, so memory stays flat regardless of catalogue size.
+    """
+    stmt = apply_event_filters(
+        select(cast(event_document(), Text)), status, tag_slug, start_date, end_date
+    ).order_by(models.Event.id).execution_options(yield_per=chunk_size)
+
+    result = await session.stream(stmt)
+    async for partition in result.partitions():
+        yield "".join(f"{row[0]}\n" for row in partition).encode("utf-8")
@@ -0,0 +1,324 @@
+"""
+Request and database metrics in the Prometheus text format (GET /metrics).
+
+MetricsMiddleware times every HTTP request per route template and counts requests in
+flight. SQLAlchemy cursor events on the engine add each statement's count and time to
+the request that ran it (tracked in a context variable), so a slow route can be split
+into time spent in the database and time spent in Python (ORM loading, serialization).
+TimedQueuePool records how long checkouts wait for a pooled connection, how many are
+waiting and how many timed out; pool_stats() reports the same for GET /health/pools.
+
+Everything runs on the event loop thread, so the counters need no locks. A request
+only appends one tuple, which is folded into the histograms later; a statement adds to
+two per-engine totals. `python -m benchmarks.bench_metrics` measures the overhead.
+"""
+import contextvars
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+UNMATCHED = "unmatched"  # requests no route matched (404s), kept out of the route label
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, key: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, key: Tuple[str, ...], value: float) -> None:
+        self.values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, key: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.values[key] = self.values.get(key, 0) - amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Per label set: one count per bucket (not cumulative until rendered), sum and count."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts, sum, count]
+
+    def observe(self, key: Tuple[str, ...], value: float) -> None:
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(names, key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+requests_total = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time until the response was sent.", ("method", "route")
+)
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled.")
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements run per request.", ("method", "route"), QUERY_BUCKETS
+)
+request_db_seconds = Histogram(
+    "http_request_db_seconds", "Time per request spent executing SQL statements.", ("method", "route")
+)
+db_statements_total = Counter(
+    "db_statements_total", "SQL statements executed, including background work.", ("pool",)
+)
+db_statement_seconds_total = Counter(
+    "db_statement_seconds_total", "Time spent executing SQL statements.", ("pool",)
+)
+db_errors_total = Counter("db_statement_errors_total", "SQL statements that raised.", ("pool",))
+pool_wait_seconds = Histogram(
+    "db_pool_checkout_wait_seconds", "Wait for a pooled connection, including connecting a new one.",
+    ("pool",), WAIT_BUCKETS,
+)
+pool_connections = Gauge(
+    "db_pool_connections", "Connections per pool: size, checked_out, overflow, idle.", ("pool", "state")
+)
+pool_waiting = Gauge("db_pool_waiting", "Checkouts waiting for a connection.", ("pool",))
+pool_timeouts_total = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after the pool timeout.", ("pool",)
+)
+replica_lag_seconds = Gauge("db_replica_lag_seconds", "Replay lag of the read replica at the last check.")
+
+METRICS = [
+    requests_total, request_seconds, requests_in_flight, request_db_queries, request_db_seconds,
+    db_statements_total, db_statement_seconds_total, db_errors_total, pool_wait_seconds, pool_connections,
+    pool_waiting, pool_timeouts_total, replica_lag_seconds,
+]
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+# Finished requests as (method, route, status, seconds, queries, db seconds). Appending
+# is much cheaper inside a request than updating four series; they are folded into the
+# metrics in one pass on every scrape, or once FOLD_EVERY have piled up.
+FOLD_EVERY = 1000
+_finished: List[Tuple[str, str, int, float, int, float]] = []
+
+
+def _fold() -> None:
+    finished = _finished[:]
+    del _finished[:len(finished)]
+    for method, route, status, elapsed, queries, db_seconds in finished:
+        key = (method, route)
+        requests_total.inc((method, route, status))
+        request_seconds.observe(key, elapsed)
+        request_db_queries.observe(key, queries)
+        request_db_seconds.observe(key, db_seconds)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task per request). Duration and query
+    counts are taken when the last body chunk is sent, so background tasks that run
+    after the response are not charged to the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        result: List[Any] = [500, None, 0, 0.0]  # status, seconds, queries, db seconds
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                result[0] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                result[1:] = time.perf_counter() - started, stats.queries, stats.db_seconds
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.dec()
+            _request.reset(token)
+            if result[1] is None:  # failed or disconnected before the response was complete
+                result[1:] = time.perf_counter() - started, stats.queries, stats.db_seconds
+            route = scope.get("route")
+            _finished.append((scope["method"], route.path if route is not None else UNMATCHED, *result))
+            if len(_finished) >= FOLD_EVERY:
+                _fold()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout waits under its `pool_logging_name`."""
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, timeout: float = 30.0, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, timeout=timeout, **kw)
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.waiting = 0  # checkouts inside _do_get; only nonzero while one is suspended
+
+    def _do_get(self):
+        name = self.logging_name or "default"
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            pool_timeouts_total.inc((name,))
+            raise
+        finally:
+            self.waiting -= 1
+            pool_wait_seconds.observe((name,), time.perf_counter() - started)
+
+
+class EngineTotals:
+    __slots__ = ("statements", "seconds", "errors")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.errors = 0
+
+
+_engines: Dict[str, Tuple[Any, EngineTotals]] = {}
+
+
+def instrument_engine(engine, name: str = "default") -> None:
+    """Count statements and their time on `engine` (an AsyncEngine or Engine) under `name`."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    totals = EngineTotals()
+    _engines[name] = (sync_engine, totals)
+
+    def record(elapsed: float) -> None:
+        totals.statements += 1
+        totals.seconds += elapsed
+        stats = _request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        record(time.perf_counter() - context._metrics_started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        started = getattr(context.execution_context, "_metrics_started", None)
+        if started is not None:
+            record(time.perf_counter() - started)
+        totals.errors += 1
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Utilisation of every instrumented engine's pool: `capacity` is size plus overflow
+    (None when unbounded) and `utilisation` the checked-out share of it.
+    """
+    stats = {}
+    for name, (sync_engine, _) in _engines.items():
+        pool = sync_engine.pool
+        if not isinstance(pool, TimedQueuePool):
+            continue
+        capacity = pool.size() + pool.max_overflow if pool.max_overflow >= 0 else None
+        checked_out = pool.checkedout()
+        stats[name] = {
+            "size": pool.size(),
+            "max_overflow": pool.max_overflow,
+            "capacity": capacity,
+            "checked_out": checked_out,
+            "overflow": max(0, pool.overflow()),
+            "idle": pool.checkedin(),
+            "waiting": pool.waiting,
+            "utilisation": round(checked_out / capacity, 3) if capacity else None,
+            "timeout_seconds": pool.timeout,
+            "timeouts": int(pool_timeouts_total.values.get((name,), 0)),
+        }
+    return stats
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    _fold()
+    for name, (sync_engine, totals) in _engines.items():
+        db_statements_total.set((name,), totals.statements)
+        db_statement_seconds_total.set((name,), totals.seconds)
+        db_errors_total.set((name,), totals.errors)
+    for name, pool in pool_stats().items():
+        for state in ("size", "checked_out", "overflow", "idle"):
+            pool_connections.set((name, state), pool[state])
+        pool_waiting.set((name,), pool["waiting"])
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,255 @@
+"""
+Opt-in query profiling: every SQL statement of a request with its time and call site,
+and statements repeated with different parameters (N+1 patterns) flagged.
+
+PROFILE_MODE selects which requests are profiled: "off" (default), "header" (requests
+sent with `X-Profile: 1`, or `X-Profile: trace` to also run cProfile over the handler)
+or "all". A profiled response carries X-Query-Count, X-Query-Time-Ms and X-Query-Repeated
+headers and its report is logged; traces are written to PROFILE_DIR as .prof files
+(snakeviz, pstats) or, without it, logged as the top functions. cProfile sees every
+task on the loop, so traces are only clean for one request at a time.
+
+The same recorder pins query budgets in checks and benchmarks:
+
+    async with assert_max_queries(3):
+        await event_service.get_event_by_slug(session, slug)
+"""
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import greenlet
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+MODE = os.getenv("PROFILE_MODE", "off")  # off | header | all
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+REPEAT_THRESHOLD = int(os.getenv("PROFILE_REPEAT_THRESHOLD", "3"))
+HEADER = b"x-profile"
+SQL_PREVIEW = 300  # characters of a statement kept in reports
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP = (os.path.abspath(__file__), os.sep + "site-packages" + os.sep)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _preview(sql: str, length: int = SQL_PREVIEW) -> str:
+    return " ".join(sql.split())[:length]
+
+
+class QueryRecorder:
+    """
+    Statements run while it is active, as (sql, seconds, call site, executemany,
+    parameters fingerprint).
+    """
+
+    def __init__(self):
+        self.statements: List[Tuple[str, float, str, bool, int]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(statement[1] for statement in self.statements)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Dict[str, Any]]:
+        """
+        Statements with the same SQL issued with at least `threshold` different parameter
+        sets: likely N+1 loops. `count` is every run, `parameter_sets` the distinct ones.
+        """
+        groups: Dict[str, List[Tuple[str, float, str, bool, int]]] = defaultdict(list)
+        for statement in self.statements:
+            groups[statement[0]].append(statement)
+        found = [
+            {
+                "sql": _preview(sql),
+                "count": len(runs),
+                "parameter_sets": len({run[4] for run in runs}),
+                "ms": round(sum(run[1] for run in runs) * 1000, 3),
+                "sites": sorted({run[2] for run in runs}),
+            }
+            for sql, runs in groups.items()
+            if len({run[4] for run in runs}) >= threshold
+        ]
+        return sorted(found, key=lambda group: -group["count"])
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "queries": self.count,
+            "db_ms": round(self.seconds * 1000, 3),
+            "repeated": self.repeated(),
+            "statements": [
+                {"sql": _preview(sql), "ms": round(seconds * 1000, 3), "site": site, "executemany": many}
+                for sql, seconds, site, many, _ in self.statements
+            ],
+        }
+
+
+_recorder: contextvars.ContextVar[Optional[QueryRecorder]] = contextvars.ContextVar("query_recorder", default=None)
+
+
+class assert_max_queries:
+    """
+    Fail with QueryBudgetExceeded when the block runs more than `n` statements. Works as
+    `with` and `async with`; `recorder` holds the statements for inspection afterwards.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.recorder = QueryRecorder()
+        self._token = None
+
+    def __enter__(self) -> QueryRecorder:
+        self._token = _recorder.set(self.recorder)
+        return self.recorder
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _recorder.reset(self._token)
+        if exc_type is None and self.recorder.count > self.n:
+            lines = [f"{self.recorder.count} queries, budget {self.n}:"]
+            lines += [f"  {site}: {_preview(sql, 120)}" for sql, _, site, *_ in self.recorder.statements]
+            raise QueryBudgetExceeded("\n".join(lines))
+
+    async def __aenter__(self) -> QueryRecorder:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+
+def call_site() -> str:
+    """
+    Innermost frame of this app's code that led to the statement. Under AsyncSession the
+    statement runs in a greenlet whose own stack ends in SQLAlchemy; the awaiting
+    coroutines are found through the parent greenlet's suspended frame.
+    """
+    frame = sys._getframe(1)
+    current = greenlet.getcurrent()
+    while True:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(ROOT) and not any(skip in filename for skip in _SKIP):
+                return f"{os.path.relpath(filename, ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            frame = frame.f_back
+        current = current.parent
+        if current is None:
+            return "?"
+        frame = current.gr_frame
+
+
+def instrument_engine(engine) -> None:
+    """Feed the active recorder, if any, from `engine` (an AsyncEngine or Engine)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _recorder.get() is not None:
+            context._profile_started = time.perf_counter()
+            context._profile_site = call_site()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        recorder = _recorder.get()
+        started = getattr(context, "_profile_started", None)
+        if recorder is not None and started is not None:
+            recorder.statements.append(
+                (statement, time.perf_counter() - started, context._profile_site, executemany, hash(repr(parameters)))
+            )
+
+
+def _requested(scope) -> Optional[str]:
+    """None, "queries" or "trace" for this request, per PROFILE_MODE and X-Profile."""
+    value = None
+    for name, header in scope.get("headers", ()):
+        if name == HEADER:
+            value = header.decode("latin-1").strip().lower()
+            break
+    if value == "trace" and MODE in ("header", "all"):
+        return "trace"
+    if MODE == "all" or (MODE == "header" and value in ("1", "true", "queries")):
+        return "queries"
+    return None
+
+
+class ProfilingMiddleware:
+    """Profiles the requests PROFILE_MODE selects; others pass straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        kind = _requested(scope) if scope["type"] == "http" else None
+        if kind is None:
+            await self.app(scope, receive, send)
+            return
+
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        profiler = cProfile.Profile() if kind == "trace" else None
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                repeated = recorder.repeated()
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-count", str(recorder.count).encode()),
+                    (b"x-query-time-ms", f"{recorder.seconds * 1000:.3f}".encode()),
+                    (b"x-query-repeated", str(len(repeated)).encode()),
+                ]
+            await send(message)
+
+        try:
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:  # another request is being traced
+                    profiler = None
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            _recorder.reset(token)
+            route = scope.get("route")
+            name = f"{scope['method']} {route.path if route is not None else scope['path']}"
+            _log_report(name, recorder, time.perf_counter() - started)
+            if profiler is not None:
+                _save_trace(name, profiler)
+
+
+def _log_report(name: str, recorder: QueryRecorder, seconds: float) -> None:
+    report = recorder.report()
+    lines = [f"{name}: {report['queries']} queries, {report['db_ms']} ms in DB, {seconds * 1000:.1f} ms total"]
+    lines += [f"  {s['ms']:>8.3f} ms  {s['site']}  {s['sql'][:120]}" for s in report["statements"]]
+    for group in report["repeated"]:
+        lines.append(
+            f"  N+1? {group['count']}x, {group['parameter_sets']} parameter sets ({group['ms']} ms)"
+            f" from {', '.join(group['sites'])}: {group['sql'][:120]}"
+        )
+    (logger.warning if report["repeated"] else logger.info)("\n".join(lines))
+
+
+def _save_trace(name: str, profiler: cProfile.Profile) -> None:
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in name).strip("_")
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}.prof")
+        profiler.dump_stats(path)
+        logger.info("%s: trace written to %s", name, path)
+        return
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+    logger.info("%s: trace\n%s", name, out.getvalue())
@@ -0,0 +1,145 @@
+import hashlib
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from db import models
+import schemas
+
+# relation -> (natural key field, fields compared on update)
+CHILD_FIELDS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "occurrences": ("start_time", ("end_time", "tz", "status", "location_name", "venue_id")),
+    "tickets": ("name", ("price", "currency", "capacity", "sold")),
+    "images": ("url", ("alt", "sort_order")),
+    "sources": ("fingerprint", ("source_url", "source_name", "confidence", "raw_payload")),
+}
+
+# Natural keys that are unique per event in the database (idx_event_time): payload
+# duplicates collapse to the last one. Other relations keep duplicates (two tickets
+# both named "VIP"), matched to stored rows in order.
+UNIQUE_KEYS = {"occurrences"}
+
+CHILD_MODELS = {
+    "occurrences": models.EventOccurrence,
+    "tickets": models.TicketType,
+    "images": models.EventImage,
+    "sources": models.EventSource,
+}
+
+
+@dataclass
+class ChildChanges:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+
+@dataclass
+class ChildDiff:
+    to_insert: List[Dict[str, Any]]
+    to_update: List[Tuple[Any, Dict[str, Any]]]  # (existing row, changed values)
+    to_delete: List[Any]
+
+    @property
+    def changes(self) -> ChildChanges:
+        return ChildChanges(len(self.to_insert), len(self.to_update), len(self.to_delete))
+
+
+def normalize(value: Any) -> Any:
+    # asyncpg stores naive datetimes in timestamptz columns as UTC
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def content_hash(event_data: schemas.EventCreate) -> str:
+    """
+    Stable hash of everything an upsert writes for this payload. Stored on the event,
+    so a re-scrape with the same content can be skipped without loading anything.
+    """
+    payload = json.dumps(
+        event_data.model_dump(mode="json"), sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def payload_venues(event_data: schemas.EventCreate) -> Dict[Tuple[str, str], schemas.VenueSchema]:
+    """Every venue of a payload by (name, city): the default one and occurrence overrides."""
+    venues = {}
+    for venue in [event_data.default_venue] + [o.venue for o in event_data.occurrences]:
+        if venue:
+            venues.setdefault((venue.name, venue.city), venue)
+    return venues
+
+
+def incoming_children(
+    event_data: schemas.EventCreate, relation: str, venue_ids: Optional[Dict[Tuple[str, str], int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Child rows of a payload as column values. Occurrences need `venue_ids` (resolved
+    payload_venues) to turn an override venue into its venue_id.
+    """
+    key_field, fields = CHILD_FIELDS[relation]
+    items = getattr(event_data, relation)
+    rows = [item.model_dump(include={key_field, *fields}) for item in items]
+    if relation == "occurrences":
+        for values, item in zip(rows, items):
+            values["venue_id"] = venue_ids[(item.venue.name, item.venue.city)] if item.venue else None
+    return rows
+
+
+def diff_children(
+    relation: str,
+    existing: Iterable[Any],
+    incoming: List[Dict[str, Any]],
+    get: Callable[[Any, str], Any] = getattr,
+) -> ChildDiff:
+    """
+    Compare stored child rows with incoming ones by natural key. `existing` may hold
+    ORM objects or result rows; `get` reads a field from one of them.
+    Rows sharing a key are paired in order (stored ones by id), except for
+    UNIQUE_KEYS relations, where incoming duplicates collapse to the last one and
+    stored duplicates are deleted.
+    """
+    key_field, fields = CHILD_FIELDS[relation]
+    unique = relation in UNIQUE_KEYS
+
+    current: Dict[Hashable, Any] = {}
+    to_delete = []
+    seen: Dict[Hashable, int] = defaultdict(int)
+    for row in sorted(existing, key=lambda row: get(row, "id") or 0):
+        key = normalize(get(row, key_field))
+        if not unique:
+            seen[key] += 1
+            key = (key, seen[key])
+        if key in current:
+            to_delete.append(row)
+        else:
+            current[key] = row
+
+    wanted: Dict[Hashable, Dict[str, Any]] = {}
+    seen.clear()
+    for values in incoming:
+        key = normalize(values[key_field])
+        if not unique:
+            seen[key] += 1
+            key = (key, seen[key])
+        wanted[key] = values
+
+    to_insert, to_update = [], []
+    for key, values in wanted.items():
+        row = current.pop(key, None)
+        if row is None:
+            to_insert.append(values)
+            continue
+        changed = {f: values[f] for f in fields if normalize(get(row, f)) != normalize(values[f])}
+        if changed:
+            to_update.append((row, changed))
+
+    to_delete.extend(current.values())
+    return ChildDiff(to_insert, to_update, to_delete)
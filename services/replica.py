@@ -0,0 +1,147 @@
+"""
+Read-replica routing with lag-aware fallback.
+
+With DATABASE_REPLICA_URL set, read-only handlers take their sessions from a
+streaming replica while writes, and the responses that return what was just written,
+stay on the primary. A monitor task asks the replica how far its replay is behind
+every REPLICA_CHECK_SECONDS; while the replica is unreachable, more than
+REPLICA_MAX_LAG_SECONDS behind, or has not answered for a few checks, reads go to the
+primary. A replica connection that is lost, or cannot be opened when a read session
+starts, switches them over at once without waiting for the next check.
+
+Replica reads can be up to the lag behind, which is fine for a response but not for
+the response cache: an entry filled from the replica right after a write would keep
+the old data until its TTL. `caught_up(since)` tells whether the replica has replayed
+everything committed before `since` (a time.monotonic() value), so such entries are
+only stored once it has.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, text
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+STALE_CHECKS = 3  # a check older than this many intervals counts as failed
+
+# Seconds of replay the replica is behind: 0 when it has replayed all the WAL it
+# received (or is not a replica at all), NULL when it has replayed nothing yet.
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaMonitor:
+    """Replica lag, probed in the background; `usable` decides where reads go."""
+
+    def __init__(self, max_lag: float = MAX_LAG_SECONDS, interval: float = CHECK_SECONDS):
+        self.max_lag = max_lag
+        self.interval = interval
+        self.engine = None
+        self.task: Optional[asyncio.Task] = None
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at = float("-inf")
+        self.replayed_until = float("-inf")  # monotonic time the replica has replayed up to
+        self.checks = 0
+        self.failures = 0
+        self.fallbacks = 0  # times reads were switched to the primary
+        self.error: Optional[str] = None
+
+    @property
+    def configured(self) -> bool:
+        return self.engine is not None
+
+    @property
+    def usable(self) -> bool:
+        return (
+            self.healthy
+            and self.lag is not None
+            and self.lag <= self.max_lag
+            and time.monotonic() - self.checked_at <= self.interval * STALE_CHECKS
+        )
+
+    def caught_up(self, since: float) -> bool:
+        """Whether the replica has replayed every commit made before monotonic time `since`."""
+        return self.usable and self.replayed_until >= since
+
+    def start(self, engine) -> None:
+        """Watch `engine` (an AsyncEngine on the replica). Reads stay on the primary until the first check."""
+        self.engine = engine
+
+        @event.listens_for(getattr(engine, "sync_engine", engine), "handle_error")
+        def _disconnected(context):
+            if context.is_disconnect or context.connection is None:  # lost, or could not connect
+                self.mark_down(str(context.original_exception))
+
+        if self.task is None:
+            self.task = asyncio.create_task(self._watch(), name="replica-monitor")
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def check(self) -> None:
+        started = time.monotonic()
+        was_usable = self.usable
+        try:
+            async with self.engine.connect() as conn:
+                lag = (await conn.execute(LAG_SQL)).scalar()
+        except Exception as e:
+            self.failures += 1
+            self.mark_down(str(e))
+            return
+        self.checks += 1
+        self.healthy = True
+        self.error = None
+        self.lag = float(lag) if lag is not None else None
+        self.checked_at = time.monotonic()
+        if self.lag is not None:
+            self.replayed_until = started - self.lag
+            metrics.replica_lag_seconds.set((), self.lag)
+        if was_usable and not self.usable:
+            self.fallbacks += 1
+            logger.warning("Replica %s s behind (max %s s): reads go to the primary", self.lag, self.max_lag)
+        elif self.usable and not was_usable:
+            logger.info("Replica %s s behind: reads go to the replica", self.lag)
+
+    def mark_down(self, error: str) -> None:
+        """Send reads to the primary until the next successful check."""
+        if self.usable:
+            self.fallbacks += 1
+            logger.warning("Replica unavailable, reads go to the primary: %s", error)
+        self.healthy = False
+        self.error = error
+
+    async def _watch(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "usable": self.usable,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "checks": self.checks,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "error": self.error,
+        }
+
+
+monitor = ReplicaMonitor()
@@ -0,0 +1,301 @@
+"""
+Process-local cache of rendered event responses.
+
+Reads dominate and data only changes when a write lands, so GET /events/{slug} and
+list pages are kept as ready-to-send bytes with a strong ETag. Writes record the slugs
+they touch on the session; once that transaction commits, the cached documents of
+those slugs and every cached list page are dropped. A rollback drops nothing.
+
+Other worker processes (and hosts) learn about the write through Postgres: the
+committing transaction sends the slugs with pg_notify, which is delivered only if it
+commits, and every process LISTENs on a connection of its own (`listener`). While
+that connection is down the caches are emptied and store nothing, since writes made
+meanwhile would go unnoticed.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+import asyncpg
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "response_cache_dirty"
+ALL = object()  # marker: every cached entry is stale
+
+CHANNEL = "response_cache"
+NOTIFY_SQL = text("SELECT pg_notify(:channel, :payload)")
+MAX_PAYLOAD = 7900  # NOTIFY payloads must stay under 8000 bytes; larger sets clear everything
+PROCESS_ID = uuid.uuid4().hex  # lets a process skip its own notifications
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    expires_at: float = 0.0
+
+
+class ResponseCache:
+    """LRU bounded by `maxsize` entries; entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.evictions = 0
+        # Bumped on every invalidation: a response read from the DB before a write
+        # committed must not be stored after that write dropped the old entry.
+        self.generation = 0
+        self.invalidated_at = float("-inf")  # time.monotonic() of the last invalidation
+        self.suspended = False  # store nothing while invalidations of other processes may be missed
+        self._data: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._data.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self._data[key]
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: CachedResponse, generation: int) -> None:
+        """Store `entry` unless something was invalidated since `generation` was read."""
+        if generation != self.generation or self.maxsize <= 0 or self.suspended:
+            return
+        entry.expires_at = time.monotonic() + self.ttl
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "suspended": self.suspended,
+        }
+
+
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# slug -> GET /events/{slug}
+event_cache = ResponseCache("events", CACHE_SIZE, CACHE_TTL)
+# normalized query -> GET /events/ page. Any write may change any page, so a commit
+# touching events clears them all.
+list_cache = ResponseCache("lists", max(1, CACHE_SIZE // 10), CACHE_TTL)
+
+CACHES = {cache.name: cache for cache in (event_cache, list_cache)}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+# --- ETags ---
+
+def event_etag(event_id: int, version: datetime) -> str:
+    """Strong ETag of an event document: its id and last modification time."""
+    return f'"e{event_id}-{int(version.timestamp() * 1_000_000):x}"'
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 9110 If-None-Match: `*` or any listed tag, compared weakly."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+# --- Write-through invalidation ---
+
+def mark_changed(session: AsyncSession, slugs: Iterable[str]) -> None:
+    """Invalidate the responses of `slugs` (and all list pages) when `session` commits."""
+    dirty = session.info.get(DIRTY_KEY)
+    if dirty is ALL:
+        return
+    slugs = set(slugs)
+    if slugs:
+        session.info[DIRTY_KEY] = (dirty or set()) | slugs
+
+
+def mark_all_changed(session: AsyncSession) -> None:
+    session.info[DIRTY_KEY] = ALL
+
+
+def _invalidate(dirty) -> None:
+    if dirty is ALL:
+        event_cache.clear()
+    else:
+        event_cache.invalidate(dirty)
+    list_cache.clear()
+
+
+def notify_payload(dirty) -> str:
+    slugs = None if dirty is ALL else sorted(dirty)
+    payload = json.dumps({"p": PROCESS_ID, "s": slugs}, ensure_ascii=False)
+    if len(payload.encode()) > MAX_PAYLOAD:
+        payload = json.dumps({"p": PROCESS_ID, "s": None})
+    return payload
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_other_processes(session: Session) -> None:
+    if session.in_nested_transaction():  # a savepoint release, only the outer commit notifies
+        return
+    dirty = session.info.get(DIRTY_KEY)
+    if dirty is not None:
+        session.execute(NOTIFY_SQL, {"channel": CHANNEL, "payload": notify_payload(dirty)})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    if session.in_nested_transaction():  # savepoint released, the transaction goes on
+        return
+    dirty = session.info.pop(DIRTY_KEY, None)
+    if dirty is not None:
+        _invalidate(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty(session: Session) -> None:
+    # A savepoint rollback keeps the set: slugs written before it still commit, and
+    # invalidating the rolled-back ones as well is harmless
+    if session.in_nested_transaction():
+        return
+    session.info.pop(DIRTY_KEY, None)
+
+
+# --- Invalidations from other processes ---
+
+NOTIFY_ENABLED = os.getenv("RESPONSE_CACHE_NOTIFY", "1") == "1"
+LISTEN_CHECK_SECONDS = float(os.getenv("RESPONSE_CACHE_LISTEN_CHECK_SECONDS", "5"))
+
+
+def _suspend(suspended: bool) -> None:
+    for cache in CACHES.values():
+        cache.clear()
+        cache.suspended = suspended
+
+
+class InvalidationListener:
+    """LISTENs on CHANNEL and applies the invalidations other processes commit."""
+
+    def __init__(self, interval: float = LISTEN_CHECK_SECONDS):
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.received = 0
+        self.disconnects = 0
+        self.error: Optional[str] = None
+
+    def start(self, dsn: str) -> None:
+        """Listen through a dedicated connection to `dsn` (a plain postgresql:// URL of the primary)."""
+        _suspend(True)
+        if self.task is None:
+            self.task = asyncio.create_task(self._listen(dsn), name="response-cache-listener")
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def _received(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed cache invalidation: %r", payload)
+            return
+        if message.get("p") == PROCESS_ID:
+            return
+        self.received += 1
+        _invalidate(ALL if message.get("s") is None else set(message["s"]))
+
+    async def _listen(self, dsn: str) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(CHANNEL, self._received)
+                _suspend(False)  # clears what was stored before notifications arrived
+                self.connected = True
+                self.error = None
+                while True:  # a dead connection only shows when it is used
+                    await asyncio.sleep(self.interval)
+                    await connection.fetchval("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected:
+                    self.disconnects += 1
+                    logger.warning("Cache invalidation listener disconnected, response caching paused: %s", e)
+                self.error = str(e)
+            finally:
+                self.connected = False
+                _suspend(True)
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.task is not None,
+            "connected": self.connected,
+            "received": self.received,
+            "disconnects": self.disconnects,
+            "error": self.error,
+        }
+
+
+listener = InvalidationListener()
@@ -0,0 +1,60 @@
+"""
+Full-text event search over the generated `events.search_vector` column (Russian
+configuration; title weighs most, then description, then full text), served by the
+idx_event_search GIN index and ranked with ts_rank_cd.
+"""
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from db import models
+import schemas
+from services.events import apply_event_filters
+
+TS_CONFIG = literal_column("'russian'::regconfig")
+
+
+def build_query(q: str, prefix: bool = False):
+    """
+    tsquery for `q`. Plain search uses websearch syntax ("quoted phrases", or, -word);
+    prefix search matches every word as a prefix, for search-as-you-type.
+    """
+    if not prefix:
+        return func.websearch_to_tsquery(TS_CONFIG, q)
+    words = re.findall(r"\w+", q.lower())
+    if not words:
+        raise ValueError("query has no words")
+    return func.to_tsquery(TS_CONFIG, " & ".join(f"{word}:*" for word in words))
+
+
+async def search_events(
+    session: AsyncSession,
+    q: str,
+    prefix: bool = False,
+    limit: int = 20,
+    skip: int = 0,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[Tuple[float, models.Event]]:
+    """Matching events as (rank, event), best first. Only summary columns are loaded."""
+    query = build_query(q, prefix)
+    rank = func.ts_rank_cd(models.Event.search_vector, query)
+    stmt = (
+        select(models.Event, rank)
+        .where(models.Event.search_vector.bool_op("@@")(query))
+        .options(load_only(
+            models.Event.id, models.Event.title, models.Event.slug, models.Event.description,
+            models.Event.age_restriction, models.Event.status,
+        ))
+        .order_by(rank.desc(), models.Event.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    stmt = apply_event_filters(stmt, status, tag_slug, start_date, end_date)
+    return [(value, event) for event, value in (await session.execute(stmt)).all()]
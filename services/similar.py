@@ -0,0 +1,183 @@
+"""
+Precomputed "similar events".
+
+Every event keeps its top-k neighbours in `event_neighbors`, so a read is one
+primary-key range lookup. Neighbours are scored as a blend of embedding cosine
+similarity (SIMILAR_EVENTS_MODEL), shared tags (Jaccard) and the same venue city.
+
+Candidates come from the model's ANN index in one LATERAL statement for the whole set
+of changed events; the blend over those few candidates is done in Python. Only the
+changed events are recomputed, plus the events whose lists they entered or left.
+"""
+import os
+from collections import defaultdict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, delete, select, text, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from db import models
+from services.sql import chunks
+
+SIMILAR_MODEL = os.getenv("SIMILAR_EVENTS_MODEL", "")
+NEIGHBORS = int(os.getenv("SIMILAR_EVENTS_K", "10"))
+CANDIDATES = int(os.getenv("SIMILAR_EVENTS_CANDIDATES", "50"))
+
+VECTOR_WEIGHT = 0.7
+TAG_WEIGHT = 0.2
+CITY_WEIGHT = 0.1
+
+
+Features = Tuple[FrozenSet[int], Optional[str]]
+
+
+async def _candidates(session: AsyncSession, event_ids: List[int], model_name: str) -> Dict[int, List[Tuple[int, float]]]:
+    """Nearest `CANDIDATES` events by embedding for each of `event_ids`: {id: [(candidate, cosine distance)]}."""
+    source = aliased(models.EventEmbedding)
+    candidate = aliased(models.EventEmbedding)
+    model = bindparam("model_name", model_name, literal_execute=True)  # matches the partial ANN index
+    distance = candidate.embedding.cosine_distance(source.embedding)
+    nearest = (
+        select(candidate.event_id.label("neighbor_id"), distance.label("distance"))
+        .where(candidate.model_name == model, candidate.event_id != source.event_id)
+        .order_by(distance)
+        .limit(CANDIDATES)
+        .lateral()
+    )
+    await session.execute(text(f"SET LOCAL hnsw.ef_search = {max(40, CANDIDATES)}"))
+
+    found: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+    for chunk in chunks(event_ids):
+        stmt = (
+            select(source.event_id, nearest.c.neighbor_id, nearest.c.distance)
+            .select_from(source)
+            .join(nearest, true())
+            .where(source.model_name == model, source.event_id.in_(chunk))
+        )
+        for event_id, neighbor_id, dist in (await session.execute(stmt)).all():
+            found[event_id].append((neighbor_id, dist))
+    return found
+
+
+async def _features(session: AsyncSession, event_ids: Iterable[int]) -> Dict[int, Features]:
+    """Tag ids and default venue city per event."""
+    event_ids = list(event_ids)
+    tags: Dict[int, Set[int]] = defaultdict(set)
+    cities: Dict[int, Optional[str]] = {}
+    for chunk in chunks(event_ids):
+        stmt = select(models.EventTag.event_id, models.EventTag.tag_id).where(models.EventTag.event_id.in_(chunk))
+        for event_id, tag_id in (await session.execute(stmt)).all():
+            tags[event_id].add(tag_id)
+        stmt = (
+            select(models.Event.id, models.Venue.city)
+            .outerjoin(models.Venue, models.Venue.id == models.Event.venue_id)
+            .where(models.Event.id.in_(chunk))
+        )
+        cities.update({event_id: city for event_id, city in (await session.execute(stmt)).all()})
+    return {event_id: (frozenset(tags[event_id]), cities.get(event_id)) for event_id in event_ids}
+
+
+def score(distance: float, own: Features, other: Features) -> float:
+    own_tags, own_city = own
+    other_tags, other_city = other
+    union = own_tags | other_tags
+    tag_overlap = len(own_tags & other_tags) / len(union) if union else 0.0
+    same_city = 1.0 if own_city and own_city == other_city else 0.0
+    return VECTOR_WEIGHT * (1.0 - distance) + TAG_WEIGHT * tag_overlap + CITY_WEIGHT * same_city
+
+
+async def _rank(session: AsyncSession, event_ids: List[int], model_name: str) -> Dict[int, List[Tuple[int, float]]]:
+    """New top-k (neighbor, score) lists for `event_ids`; events without an embedding get none."""
+    candidates = await _candidates(session, event_ids, model_name)
+    involved = set(event_ids) | {n for found in candidates.values() for n, _ in found}
+    features = await _features(session, involved)
+    ranked = {}
+    for event_id in event_ids:
+        scored = [
+            (neighbor_id, score(dist, features[event_id], features[neighbor_id]))
+            for neighbor_id, dist in candidates.get(event_id, ())
+            if neighbor_id in features  # deleted meanwhile
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        ranked[event_id] = scored[:NEIGHBORS]
+    return ranked
+
+
+async def _store(session: AsyncSession, ranked: Dict[int, List[Tuple[int, float]]]) -> None:
+    event_ids = list(ranked)
+    for chunk in chunks(event_ids):
+        await session.execute(delete(models.EventNeighbor).where(models.EventNeighbor.event_id.in_(chunk)))
+    rows = [
+        {"event_id": event_id, "rank": rank, "neighbor_id": neighbor_id, "score": value}
+        for event_id, neighbors in ranked.items()
+        for rank, (neighbor_id, value) in enumerate(neighbors, start=1)
+    ]
+    for chunk in chunks(rows, 4):
+        await session.execute(insert(models.EventNeighbor).values(chunk))
+
+
+async def recompute_neighbors(session: AsyncSession, event_ids: Iterable[int], model_name: str = SIMILAR_MODEL) -> int:
+    """
+    Recompute the neighbour lists of `event_ids`, then of every event whose list
+    contained one of them or may now contain one (their new neighbours). Returns the
+    number of lists written. The caller commits.
+    """
+    changed = sorted(set(event_ids))
+    if not changed or not model_name:
+        return 0
+
+    referrers = set()
+    for chunk in chunks(changed):
+        stmt = select(models.EventNeighbor.event_id).where(models.EventNeighbor.neighbor_id.in_(chunk))
+        referrers.update((await session.execute(stmt)).scalars())
+
+    ranked = await _rank(session, changed, model_name)
+    affected = (referrers | {n for neighbors in ranked.values() for n, _ in neighbors}) - set(changed)
+    if affected:
+        ranked.update(await _rank(session, sorted(affected), model_name))
+    await _store(session, ranked)
+    return len(ranked)
+
+
+async def refresh_neighbors(
+    session_factory: Callable[[], AsyncSession],
+    slugs: Iterable[str] = (),
+    model_name: Optional[str] = None,
+) -> int:
+    """
+    Background entry point: recompute after `slugs` changed, in its own session. Only
+    re-embedding with SIMILAR_EVENTS_MODEL matters; other models are ignored.
+    """
+    if model_name is not None and model_name != SIMILAR_MODEL:
+        return 0
+    slugs = list(set(slugs))
+    if not slugs or not SIMILAR_MODEL:
+        return 0
+    async with session_factory() as session:
+        event_ids = []
+        for chunk in chunks(slugs):
+            stmt = select(models.Event.id).where(models.Event.slug.in_(chunk))
+            event_ids += (await session.execute(stmt)).scalars().all()
+        written = await recompute_neighbors(session, event_ids)
+        await session.commit()
+    return written
+
+
+async def get_similar(session: AsyncSession, slug: str) -> Optional[List[Tuple[float, models.Event]]]:
+    """Stored neighbours of `slug` as (score, event), best first; None if there is no such event."""
+    source = aliased(models.Event)
+    neighbor = aliased(models.Event)
+    stmt = (
+        select(source.id, models.EventNeighbor.score, neighbor)
+        .select_from(source)
+        .outerjoin(models.EventNeighbor, models.EventNeighbor.event_id == source.id)
+        .outerjoin(neighbor, neighbor.id == models.EventNeighbor.neighbor_id)
+        .where(source.slug == slug)
+        .order_by(models.EventNeighbor.rank)
+    )
+    rows = (await session.execute(stmt)).all()
+    if not rows:
+        return None
+    return [(value, event) for _, value, event in rows if event is not None]
@@ -0,0 +1,60 @@
+"""
+Request coalescing for identical concurrent reads.
+
+When many requests for the same key arrive while its load is still running, they all
+await that one load instead of each checking out a connection and repeating it.
+Nothing is kept once the load finishes; caching is services/response_cache.py's job.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.loads = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        """
+        Result of `load()`, shared with every concurrent caller using the same key.
+        The load runs as its own task: a caller that is cancelled (client went away)
+        stops waiting without cancelling it for the others. Errors reach every caller.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.loads += 1
+            task = asyncio.ensure_future(load())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller was cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.loads + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
+
+
+event_flight = SingleFlight("events")
+list_flight = SingleFlight("lists")
+
+FLIGHTS = {flight.name: flight for flight in (event_flight, list_flight)}
+
+
+def flight_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
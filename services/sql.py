@@ -0,0 +1,14 @@
+"""Limits and helpers for statements built from many values."""
+from typing import Iterable, List, Sequence, TypeVar
+
+# asyncpg refuses statements with more than 32767 bind parameters
+MAX_BIND_PARAMS = 32000
+
+T = TypeVar("T")
+
+
+def chunks(values: Sequence[T], width: int = 1) -> Iterable[List[T]]:
+    """Slices of `values` small enough to bind `width` parameters per value in one statement."""
+    size = max(1, MAX_BIND_PARAMS // max(1, width))
+    for i in range(0, len(values), size):
+        yield list(values[i:i + size])
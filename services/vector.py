@@ -0,0 +1,95 @@
+"""
+Nearest-neighbour search over event embeddings (pgvector, cosine distance).
+
+Searches are always restricted to one model_name, which lets Postgres use that
+model's partial HNSW/IVFFlat index (see database.vector_index_statement). Event
+filters are applied while walking the index, so a very selective filter can return
+fewer than k hits; raise ef_search / probes to look further.
+"""
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Text, bindparam, cast, func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+import schemas
+from services.events import apply_event_filters
+from services.materialize import EMPTY_ARRAY, event_document
+
+DIMENSIONS = models.EventEmbedding.embedding.type.dim
+
+
+def _nearest(
+    vector: Sequence[float],
+    model_name: str,
+    k: int,
+    status: Optional[schemas.EventStatus] = None,
+    tag_slug: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    if len(vector) != DIMENSIONS:
+        raise ValueError(f"vector must have {DIMENSIONS} dimensions, got {len(vector)}")
+    emb = models.EventEmbedding
+    distance = emb.embedding.cosine_distance(vector)
+    stmt = (
+        select(emb.event_id, distance.label("distance"))
+        .join(models.Event, models.Event.id == emb.event_id)
+        # Inlined, not bound: a generic plan could not match the partial index predicate
+        .where(emb.model_name == bindparam("model_name", model_name, literal_execute=True))
+    )
+    return apply_event_filters(stmt, status, tag_slug, start_date, end_date).order_by(distance).limit(k)
+
+
+async def _tune(session: AsyncSession, ef_search: Optional[int], probes: Optional[int], k: int, exact: bool) -> None:
+    """Per-transaction search settings. HNSW never returns more than ef_search rows."""
+    if exact:
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        return
+    await session.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(ef_search or 40), k)}"))
+    if probes:
+        await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+
+async def search_event_ids(
+    session: AsyncSession,
+    vector: Sequence[float],
+    model_name: str,
+    k: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    exact: bool = False,
+    **filters,
+) -> List[Tuple[int, float]]:
+    """(event id, cosine distance) of the k nearest events. `exact` bypasses the index."""
+    stmt = _nearest(vector, model_name, k, **filters)
+    await _tune(session, ef_search, probes, k, exact)
+    return [(event_id, distance) for event_id, distance in (await session.execute(stmt)).all()]
+
+
+async def search_events_json(
+    session: AsyncSession,
+    vector: Sequence[float],
+    model_name: str,
+    k: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    **filters,
+) -> bytes:
+    """The k nearest events as a JSON array of {"distance", "event"}, nearest first, in one statement."""
+    hits = _nearest(vector, model_name, k, **filters).subquery()
+    stmt = (
+        select(cast(func.coalesce(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object("distance", hits.c.distance, "event", event_document()),
+                hits.c.distance,
+            )),
+            EMPTY_ARRAY,
+        ), Text))
+        .select_from(hits)
+        .join(models.Event, models.Event.id == hits.c.event_id)
+    )
+    await _tune(session, ef_search, probes, k, exact=False)
+    return (await session.execute(stmt)).scalar_one().encode("utf-8")